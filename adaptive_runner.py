@@ -0,0 +1,91 @@
+# library imports
+import math
+import numpy as np
+
+# project imports
+
+
+class AdaptiveRunner:
+    """
+    Sequential sampling of a single cell of an experiment - replicates are added in batches until the confidence
+    interval of the metric's mean is narrow enough, or until a cap on the number of replicates is reached.
+    Cells with (almost) no variance stop after the first batches, so the budget goes to the noisy ones.
+    """
+
+    def __init__(self,
+                 target_half_width: float,
+                 relative_half_width: float = 0,
+                 min_repeat: int = 10,
+                 max_repeat: int = 100,
+                 batch_size: int = 10,
+                 confidence: float = 0.95):
+        # stop once the half-width is at most max(target_half_width, relative_half_width * |mean|)
+        self.target_half_width = target_half_width
+        self.relative_half_width = relative_half_width
+        self.min_repeat = min_repeat
+        self.max_repeat = max_repeat
+        self.batch_size = batch_size
+        self.confidence = confidence
+
+    def run(self,
+            sample_function) -> dict:
+        """
+        Call "sample_function(first, count)" (that returns the metric values of replicates first, ..., first + count - 1,
+        NaN for a failed replicate) until the target precision or the cap is reached. Returns the summary of the cell and
+        the number of replicates it took.
+        """
+        values = []
+        while True:
+            values.extend(sample_function(len(values), min(self.batch_size, self.max_repeat - len(values))))
+            if len(values) >= self.max_repeat or (len(values) >= self.min_repeat and self.is_precise(values=values)):
+                break
+        answer = AdaptiveRunner.summary(values=values,
+                                        confidence=self.confidence)
+        answer["repeats"] = len(values)
+        return answer
+
+    def is_precise(self,
+                   values: list) -> bool:
+        summary = AdaptiveRunner.summary(values=values,
+                                         confidence=self.confidence)
+        return summary["half_width"] <= max(self.target_half_width, self.relative_half_width * abs(summary["mean"]))
+
+    @staticmethod
+    def summary(values: list,
+                confidence: float = 0.95) -> dict:
+        """
+        The mean, std and the half-width of the normal confidence interval of the mean, over the (count) non-NaN values
+        """
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return {"mean": math.nan, "std": math.nan, "half_width": math.inf, "count": 0}
+        half_width = math.inf if len(values) < 2 \
+            else AdaptiveRunner.z_value(confidence=confidence) * np.std(values, ddof=1) / math.sqrt(len(values))
+        return {"mean": float(np.mean(values)),
+                "std": float(np.std(values)),
+                "half_width": float(half_width),
+                "count": int(len(values))}
+
+    @staticmethod
+    def z_value(confidence: float) -> float:
+        """
+        The two-sided normal quantile of the confidence - the z where P(|Z| <= z) = confidence, found by bisection on
+        math.erf (statistics.NormalDist needs python 3.8)
+        """
+        low, high = 0.0, 40.0
+        for _ in range(100):
+            middle = (low + high) / 2
+            if math.erf(middle / math.sqrt(2)) < confidence:
+                low = middle
+            else:
+                high = middle
+        return (low + high) / 2
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __str__(self):
+        return "<AdaptiveRunner: half-width<={}, {}-{} repeats>".format(self.target_half_width,
+                                                                        self.min_repeat,
+                                                                        self.max_repeat)
@@ -0,0 +1,323 @@
+# library imports
+import gc
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+import platform
+import numpy as np
+
+# project imports
+from graph import Graph
+from sim import Simulator
+from jit_kernels import JitKernels
+from columnar_population import ColumnarPopulation
+from pips.multi_aggressive_pip import PIPMultiAggressive
+from pips.single_aggressive_pip import PIPSignleAggressive
+from walks.walk_random import WalkRandom
+from walks.normalized_density import WalkNormalizedDensity
+from walks.walk_social_distance import WalkSocialDistance
+from walks.walk_random_with_stay import WalkRandomWithStay
+from walks.walk_random_with_weighted_stay import WalkRandomWithWeightedStay
+
+
+class Benchmark:
+    """
+    A scaling benchmark of the simulation's hot paths - a full step and each of its phases (SEIRD, walk, PIP and
+    gathering the state), over a matrix of population sizes, graph sizes, graph densities, walk policies, PIPs and
+    population types (columnar or a list of agents), with and without the compiled kernels if numba is installed.
+    The results are machine-readable (JSON, with agent-steps per second) and can be compared with a stored baseline
+    to catch regressions before a long run.
+    """
+
+    # CONSTS #
+    AGENT_COUNTS = [10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6]
+    NODE_COUNTS = [10, 100, 1000, 10000]
+    # the mean number of out edges of a node
+    DEGREES = [2, 10]
+    QUICK_AGENT_COUNTS = [10 ** 3, 10 ** 4]
+    QUICK_NODE_COUNTS = [10, 100]
+    QUICK_DEGREES = [2]
+
+    WALKS = {"random": lambda: WalkRandom(),
+             "random_with_stay": lambda: WalkRandomWithStay(),
+             "random_with_weighted_stay": lambda: WalkRandomWithWeightedStay(weight=0.5),
+             "normalized_density": lambda: WalkNormalizedDensity(),
+             "social_distance": lambda: WalkSocialDistance(obey_rate=0.5)}
+    PIPS = {"multi_aggressive": lambda node_count: PIPMultiAggressive(
+                control_node_ids=list(range(max(1, round(node_count * Benchmark.IU_COVERAGE))))),
+            "single_aggressive": lambda node_count: PIPSignleAggressive(control_node_id=0)}
+    COLUMNAR_POPULATION = "columnar"
+    AGENTS_POPULATION = "agents"
+    POPULATIONS = [COLUMNAR_POPULATION, AGENTS_POPULATION]
+    # larger lists of agent objects take minutes per scenario, so they are skipped
+    MAX_AGENT_OBJECTS = 10 ** 5
+
+    PHASES = ["run_step", "seird", "walk", "pip", "gather"]
+    REPEATS = 5
+    # each repeat times as many steps of the phase (1, 2, 5, 10, 20, ...) as it takes to run at least this long, so a
+    # fast phase is not lost in the timer's noise
+    MIN_REPEAT_SECONDS = 0.02
+    WARMUP_STEPS = 2
+    IU_COVERAGE = 0.1
+    INFECT_PORTION = 0.02
+
+    # slower than the baseline by more than this portion is a regression
+    TOLERANCE = 0.25
+    # END - CONSTS #
+
+    def __init__(self):
+        pass
+
+    @staticmethod
+    def run(agent_counts: list = None,
+            node_counts: list = None,
+            degrees: list = None,
+            walks: list = None,
+            pips: list = None,
+            populations: list = None,
+            repeats: int = REPEATS,
+            seed: int = 0) -> dict:
+        """
+        Measure every phase on every (agents, nodes, degree, walk, PIP, population, compiled kernels) scenario of the
+        matrix
+        """
+        agent_counts = agent_counts if agent_counts is not None else Benchmark.AGENT_COUNTS
+        node_counts = node_counts if node_counts is not None else Benchmark.NODE_COUNTS
+        degrees = degrees if degrees is not None else Benchmark.DEGREES
+        walks = walks if walks is not None else list(Benchmark.WALKS.keys())
+        pips = pips if pips is not None else list(Benchmark.PIPS.keys())
+        populations = populations if populations is not None else Benchmark.POPULATIONS
+        jit_modes = [True, False] if JitKernels.AVAILABLE else [False]
+        jit_enabled = JitKernels.ENABLED
+        graphs = {}
+        for node_count, degree in itertools.product(node_counts, degrees):
+            np.random.seed(seed)
+            graphs[(node_count, degree)] = Benchmark.random_graph(node_count=node_count,
+                                                                  degree=degree)
+        scenarios = [(agent_count, node_count, degree, walk, pip, population, jit)
+                     for node_count, degree, agent_count, walk, pip, population, jit
+                     in itertools.product(node_counts, degrees, agent_counts, walks, pips, populations, jit_modes)
+                     if population != Benchmark.AGENTS_POPULATION or agent_count <= Benchmark.MAX_AGENT_OBJECTS]
+        step_counts = {scenario: {} for scenario in scenarios}
+        phase_seconds = {scenario: {} for scenario in scenarios}
+        # the machine's speed drifts over tens of seconds, so each round times every scenario once and an entry keeps
+        # its fastest round, instead of timing the repeats of a scenario back to back in the same slow (or fast) spell
+        for _ in range(repeats):
+            for scenario in scenarios:
+                agent_count, node_count, degree, walk, pip, population, jit = scenario
+                np.random.seed(seed)
+                sim = Benchmark.scenario(graph=graphs[(node_count, degree)],
+                                         agent_count=agent_count,
+                                         walk=walk,
+                                         pip=pip,
+                                         population=population)
+                JitKernels.ENABLED = jit
+                try:
+                    round_seconds = Benchmark.measure(sim=sim,
+                                                      step_counts=step_counts[scenario])
+                finally:
+                    JitKernels.ENABLED = jit_enabled
+                for phase, seconds in round_seconds.items():
+                    phase_seconds[scenario][phase] = min(seconds, phase_seconds[scenario].get(phase, float("inf")))
+        results = []
+        for scenario in scenarios:
+            agent_count, node_count, degree, walk, pip, population, jit = scenario
+            for phase, seconds in phase_seconds[scenario].items():
+                results.append({"agents": agent_count,
+                                "nodes": node_count,
+                                "degree": degree,
+                                "walk": walk,
+                                "pip": pip,
+                                "population": population,
+                                "jit": jit,
+                                "phase": phase,
+                                "seconds": seconds,
+                                "agent_steps_per_sec": agent_count / seconds if seconds > 0 else float("inf")})
+                print("Benchmark: agents={:>8} nodes={:>6} degree={:>3} {} {} {}{} {:<9} {:10.6f}s {:14.0f} agent-steps/s".format(
+                    agent_count, node_count, degree, walk, pip, population, " jit" if jit else "", phase,
+                    seconds, results[-1]["agent_steps_per_sec"]))
+        return {"machine": Benchmark.machine(),
+                "repeats": repeats,
+                "results": results}
+
+    @staticmethod
+    def scenario(graph: Graph,
+                 agent_count: int,
+                 walk: str = "random_with_stay",
+                 pip: str = "multi_aggressive",
+                 population: str = COLUMNAR_POPULATION) -> Simulator:
+        """
+        A random population (columnar or a list of agents) walking on the graph with the given walk, and the given PIP
+        """
+        agents = ColumnarPopulation.random(population_count=agent_count,
+                                           graph=graph,
+                                           infect_portion=Benchmark.INFECT_PORTION)
+        return Simulator(population=agents if population == Benchmark.COLUMNAR_POPULATION else agents.to_population(),
+                         graph=graph,
+                         walk_policy=Benchmark.WALKS[walk](),
+                         pip=Benchmark.PIPS[pip](graph.get_size()),
+                         max_time=Benchmark.WARMUP_STEPS + 1)
+
+    @staticmethod
+    def measure(sim: Simulator,
+                step_counts: dict) -> dict:
+        """
+        The wall time (seconds) of a single step of each phase, timing enough steps to take "MIN_REPEAT_SECONDS" on a
+        fresh clone of the warmed-up simulator. The number of steps of a phase is found on the first call and kept in
+        "step_counts", so every repeat of a scenario times the same steps. "run" keeps the fastest repeat, the least
+        noisy estimate of what the code costs, and the baseline comparison uses it.
+        """
+        # warm up - compile the walk table, attach the calendar and get a mixed population
+        for _ in range(Benchmark.WARMUP_STEPS):
+            sim.run_step()
+        phase_functions = {"run_step": lambda this_sim: this_sim.run_step(),
+                           "seird": lambda this_sim: this_sim.seird_step(),
+                           "walk": lambda this_sim: this_sim.walk_step(),
+                           "pip": lambda this_sim: this_sim.pip_step(),
+                           "gather": lambda this_sim: this_sim.gather_epi_state()}
+        answer = {}
+        for phase in Benchmark.PHASES:
+            if phase not in step_counts:
+                step_counts[phase] = Benchmark._step_count(sim=sim,
+                                                           phase_function=phase_functions[phase])
+            answer[phase] = Benchmark._time_steps(sim=sim,
+                                                  phase_function=phase_functions[phase],
+                                                  step_count=step_counts[phase]) / step_counts[phase]
+        return answer
+
+    @staticmethod
+    def _step_count(sim: Simulator,
+                    phase_function) -> int:
+        """
+        The number of steps of the phase (1, 2, 5, 10, 20, ...) that take at least "MIN_REPEAT_SECONDS"
+        """
+        for power in itertools.count():
+            for factor in (1, 2, 5):
+                step_count = factor * 10 ** power
+                if Benchmark._time_steps(sim=sim,
+                                         phase_function=phase_function,
+                                         step_count=step_count) >= Benchmark.MIN_REPEAT_SECONDS:
+                    return step_count
+
+    @staticmethod
+    def _time_steps(sim: Simulator,
+                    phase_function,
+                    step_count: int) -> float:
+        """
+        The wall time of "step_count" steps of the phase on a fresh clone of the simulator, with the garbage collector
+        off (as "timeit" does) so a collection of the agent objects does not land on a random phase
+        """
+        this_sim = sim.clone()
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            for _ in range(step_count):
+                phase_function(this_sim)
+            return time.perf_counter() - start
+        finally:
+            gc.enable()
+
+    @staticmethod
+    def random_graph(node_count: int,
+                     degree: int) -> Graph:
+        """
+        A uniform random directed graph with "degree" out edges per node on average
+        """
+        return Graph.erdos_renyi(node_count=node_count,
+                                 edge_count=node_count * degree)
+
+    @staticmethod
+    def compare(report: dict,
+                baseline: dict,
+                tolerance: float = TOLERANCE) -> list:
+        """
+        The (scenario, phase) entries that are slower than in the baseline by more than the tolerance
+        """
+        baseline_seconds = {Benchmark._entry_key(entry=entry): entry["seconds"] for entry in baseline["results"]}
+        regressions = []
+        for entry in report["results"]:
+            key = Benchmark._entry_key(entry=entry)
+            if key in baseline_seconds and entry["seconds"] > baseline_seconds[key] * (1 + tolerance):
+                regressions.append(dict(entry,
+                                        baseline_seconds=baseline_seconds[key],
+                                        slowdown=entry["seconds"] / baseline_seconds[key]))
+        return regressions
+
+    @staticmethod
+    def machine() -> dict:
+        return {"python": platform.python_version(),
+                "numpy": np.__version__,
+                "platform": platform.platform(),
+                "numba": JitKernels.AVAILABLE,
+                "cpu_count": os.cpu_count(),
+                "time": time.strftime("%Y-%m-%d %H:%M:%S")}
+
+    @staticmethod
+    def save(report: dict,
+             path: str):
+        with open(path, "w") as report_file:
+            json.dump(report, report_file, indent=2)
+
+    @staticmethod
+    def load(path: str) -> dict:
+        with open(path, "r") as report_file:
+            return json.load(report_file)
+
+    @staticmethod
+    def _entry_key(entry: dict):
+        return tuple(entry.get(name) for name in ("agents", "nodes", "degree", "walk", "pip", "population", "jit", "phase"))
+
+    @staticmethod
+    def main(args: list = None) -> int:
+        """
+        Run the benchmark from the command line, returns 1 if there are regressions compared to the baseline
+        """
+        parser = argparse.ArgumentParser(description="Scaling benchmark of the simulation's hot paths")
+        parser.add_argument("--quick", action="store_true", help="a small matrix, for a fast check")
+        parser.add_argument("--agents", type=int, nargs="+", help="the population sizes")
+        parser.add_argument("--nodes", type=int, nargs="+", help="the graph sizes")
+        parser.add_argument("--degrees", type=int, nargs="+", help="the mean out degrees of the graph")
+        parser.add_argument("--walks", nargs="+", choices=list(Benchmark.WALKS.keys()), help="the walk policies")
+        parser.add_argument("--pips", nargs="+", choices=list(Benchmark.PIPS.keys()), help="the PIPs")
+        parser.add_argument("--populations", nargs="+", choices=Benchmark.POPULATIONS, help="the population types")
+        parser.add_argument("--repeats", type=int, default=Benchmark.REPEATS)
+        parser.add_argument("--output", default=None, help="save the results to this JSON file")
+        parser.add_argument("--baseline", default=None, help="compare with the results in this JSON file")
+        parser.add_argument("--tolerance", type=float, default=Benchmark.TOLERANCE)
+        args = parser.parse_args(args)
+        report = Benchmark.run(agent_counts=args.agents or (Benchmark.QUICK_AGENT_COUNTS if args.quick else None),
+                               node_counts=args.nodes or (Benchmark.QUICK_NODE_COUNTS if args.quick else None),
+                               degrees=args.degrees or (Benchmark.QUICK_DEGREES if args.quick else None),
+                               walks=args.walks,
+                               pips=args.pips,
+                               populations=args.populations,
+                               repeats=args.repeats)
+        if args.output is not None:
+            Benchmark.save(report=report,
+                           path=args.output)
+        if args.baseline is None:
+            return 0
+        regressions = Benchmark.compare(report=report,
+                                        baseline=Benchmark.load(path=args.baseline),
+                                        tolerance=args.tolerance)
+        for entry in regressions:
+            print("Benchmark: REGRESSION agents={} nodes={} degree={} {} {} {}{} {} - {:.6f}s vs {:.6f}s ({:.2f}x)".format(
+                entry["agents"], entry["nodes"], entry["degree"], entry["walk"], entry["pip"], entry["population"],
+                " jit" if entry["jit"] else "", entry["phase"], entry["seconds"], entry["baseline_seconds"],
+                entry["slowdown"]))
+        print("Benchmark: {} regressions".format(len(regressions)))
+        return 1 if len(regressions) > 0 else 0
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __str__(self):
+        return "<Benchmark>"
+
+
+if __name__ == '__main__':
+    sys.exit(Benchmark.main())
@@ -0,0 +1,310 @@
+# library imports
+import numpy as np
+
+# project imports
+from agent import Agent
+from graph import Graph
+from population import Population
+from epidemiological_state import EpidemiologicalState
+
+
+class AgentView(Agent):
+    """
+    A single agent of a columnar population - reads and writes the population's arrays in place
+    """
+
+    def __init__(self,
+                 population,
+                 index: int):
+        self.population = population
+        self.index = index
+
+    @property
+    def e_state(self):
+        return EpidemiologicalState(int(self.population.e_states[self.index]))
+
+    @e_state.setter
+    def e_state(self,
+                new_e_state: EpidemiologicalState):
+        self.population.set_e_state(indices=self.index,
+                                    new_e_state=new_e_state,
+                                    reset_timer=False)
+
+    @property
+    def location(self):
+        return int(self.population.locations[self.index])
+
+    @location.setter
+    def location(self,
+                 new_location: int):
+        self.population.set_location(indices=self.index,
+                                     new_locations=new_location)
+
+    @property
+    def timer(self):
+        return int(self.population.clock - self.population.timer_origins[self.index])
+
+    @timer.setter
+    def timer(self,
+              new_timer: int):
+        self.population.set_timer(indices=self.index,
+                                  new_timers=new_timer)
+
+    @property
+    def mask(self):
+        return bool(self.population.masks[self.index])
+
+    @mask.setter
+    def mask(self,
+             new_mask: bool):
+        self.population.masks[self.index] = new_mask
+
+
+class ColumnarPopulation(Population):
+    """
+    The population in the simulator - stored as a structure of arrays (one entry per agent) instead of a list of
+    "Agent" objects. The "agents" property gives the old list API as views on these arrays.
+    Running counters of the agents in each epidemiological state and in each node are kept up to date by the smart
+    setters, so the arrays should be changed only with them (or followed by a call to "recount").
+    The timers are kept as the population clock at which each timer was zero, so a tic of everyone is O(1).
+    An attached transition calendar is told about every agent that enters E or I.
+    """
+
+    E_STATE_TYPE = np.int8
+    LOCATION_TYPE = np.int32
+    TIMER_TYPE = np.int32
+
+    def __init__(self,
+                 e_states,
+                 locations,
+                 timers,
+                 masks):
+        self.e_states = np.array(e_states, dtype=ColumnarPopulation.E_STATE_TYPE)
+        self.locations = np.array(locations, dtype=ColumnarPopulation.LOCATION_TYPE)
+        self.clock = 0
+        self.timer_origins = -np.array(timers, dtype=ColumnarPopulation.TIMER_TYPE)
+        self.masks = np.array(masks, dtype=bool)
+        self.calendar = None
+        self.recount()
+
+    @property
+    def timers(self):
+        """
+        The timers of all the agents (a new array - change them with "set_timer")
+        """
+        return (self.clock - self.timer_origins).astype(ColumnarPopulation.TIMER_TYPE)
+
+    @property
+    def agents(self):
+        return [AgentView(population=self, index=index) for index in range(self.get_size())]
+
+    def get_size(self):
+        return len(self.e_states)
+
+    # smart getters #
+
+    def count_node(self,
+                   node_id: int):
+        return int(self._occupancy[node_id]) if 0 <= node_id < len(self._occupancy) else 0
+
+    def count_states(self):
+        return self._state_counts.tolist()
+
+    def count_locations(self,
+                        node_count: int):
+        return self.get_occupancy(node_count=node_count).tolist()
+
+    def count_node_states(self,
+                          node_count: int) -> np.ndarray:
+        """
+        The number of agents in each epidemiological state in each node, as a (node_count x states) array
+        """
+        state_count = len(EpidemiologicalState)
+        return np.bincount(self.locations.astype(np.int64) * state_count + self.e_states,
+                           minlength=node_count * state_count)[:node_count * state_count].reshape(node_count, state_count)
+
+    def get_occupancy(self,
+                      node_count: int) -> np.ndarray:
+        """
+        A copy of the running number of agents in each node, as an array of (at least) "node_count" entries
+        """
+        answer = np.zeros(max(node_count, len(self._occupancy)), dtype=np.int64)
+        answer[:len(self._occupancy)] = self._occupancy
+        return answer
+
+    def live_indices(self):
+        return np.flatnonzero(self.e_states != EpidemiologicalState.D)
+
+    def group_by_location(self,
+                          indices: np.ndarray = None):
+        """
+        Split the given agents (all of them by default) to (node id, agents indexes) pairs, keeping the agents' order
+        """
+        if indices is None:
+            indices = np.arange(self.get_size())
+        if len(indices) == 0:
+            return []
+        indices = indices[np.argsort(self.locations[indices], kind="stable")]
+        node_ids, starts = np.unique(self.locations[indices], return_index=True)
+        return list(zip(node_ids.tolist(), np.split(indices, starts[1:])))
+
+    # end - smart getters #
+
+    # smart setters #
+
+    def tic(self,
+            indices: np.ndarray = None):
+        if indices is None:
+            self.clock += 1
+        else:
+            indices = ColumnarPopulation._as_indices(indices=indices)
+            self.timer_origins[indices] -= 1
+            self._reschedule(indices=indices)
+
+    def set_timer(self,
+                  indices: np.ndarray,
+                  new_timers):
+        indices = ColumnarPopulation._as_indices(indices=indices)
+        self.timer_origins[indices] = self.clock - np.asarray(new_timers)
+        self._reschedule(indices=indices)
+
+    def set_e_state(self,
+                    indices: np.ndarray,
+                    new_e_state: EpidemiologicalState,
+                    reset_timer: bool = True):
+        indices = ColumnarPopulation._as_indices(indices=indices)
+        old_e_states = self.e_states[indices]
+        self._state_counts -= np.bincount(old_e_states, minlength=len(self._state_counts))
+        self._state_counts[int(new_e_state)] += len(old_e_states)
+        self.e_states[indices] = int(new_e_state)
+        if reset_timer:
+            self.timer_origins[indices] = self.clock
+        if self.calendar is not None:
+            self.calendar.schedule(population=self,
+                                   indices=indices,
+                                   e_state=new_e_state)
+
+    def set_location(self,
+                     indices: np.ndarray,
+                     new_locations):
+        if np.ndim(indices) == 0:
+            # single agent - the common case of the sequential walks
+            self._occupancy[self.locations[indices]] -= 1
+            self.locations[indices] = new_locations
+            self._grow_occupancy(max_location=new_locations)
+            self._occupancy[new_locations] += 1
+            return
+        old_locations = self.locations[indices]
+        self.locations[indices] = new_locations
+        new_locations = self.locations[indices]
+        if len(new_locations) == 0:
+            return
+        self._grow_occupancy(max_location=int(new_locations.max()))
+        self._occupancy -= np.bincount(old_locations, minlength=len(self._occupancy))
+        self._occupancy += np.bincount(new_locations, minlength=len(self._occupancy))
+
+    def put_mask(self,
+                 indices: np.ndarray):
+        self.masks[indices] = True
+
+    def attach_calendar(self,
+                        calendar):
+        """
+        Let the given transition calendar follow the agents that enter E or I (starting with the current ones)
+        """
+        self.calendar = calendar
+        calendar.rebuild(population=self)
+
+    def recount(self):
+        """
+        Compute the running counters (and the calendar, if any) from the arrays
+        """
+        self._state_counts = np.bincount(self.e_states, minlength=len(EpidemiologicalState)).astype(np.int64)
+        self._occupancy = np.bincount(self.locations).astype(np.int64) if self.get_size() > 0 else np.zeros(0, dtype=np.int64)
+        if self.calendar is not None:
+            self.calendar.rebuild(population=self)
+
+    def _reschedule(self,
+                    indices: np.ndarray):
+        if self.calendar is None:
+            return
+        for e_state in (EpidemiologicalState.E, EpidemiologicalState.I):
+            self.calendar.schedule(population=self,
+                                   indices=indices[self.e_states[indices] == e_state],
+                                   e_state=e_state)
+
+    @staticmethod
+    def _as_indices(indices) -> np.ndarray:
+        indices = np.atleast_1d(indices)
+        return np.flatnonzero(indices) if indices.dtype == bool else indices
+
+    def _grow_occupancy(self,
+                        max_location: int):
+        if max_location >= len(self._occupancy):
+            self._occupancy = np.concatenate((self._occupancy,
+                                              np.zeros(max_location + 1 - len(self._occupancy), dtype=np.int64)))
+
+    # end - smart setters #
+
+    # logic #
+
+    def copy(self):
+        """
+        A copy of the population state - the arrays and the running counters are copied in bulk (no recount) and the
+        calendar shares its queued index arrays, which are never changed in place
+        """
+        answer = ColumnarPopulation.__new__(ColumnarPopulation)
+        answer.e_states = self.e_states.copy()
+        answer.locations = self.locations.copy()
+        answer.clock = self.clock
+        answer.timer_origins = self.timer_origins.copy()
+        answer.masks = self.masks.copy()
+        answer.calendar = self.calendar.copy() if self.calendar is not None else None
+        answer._state_counts = self._state_counts.copy()
+        answer._occupancy = self._occupancy.copy()
+        return answer
+
+    def to_population(self):
+        """
+        Convert back to a list of "Agent" objects
+        """
+        return Population(agents=[Agent(epidimiological_state=EpidemiologicalState(int(e_state)),
+                                        location=int(location),
+                                        timer=int(timer),
+                                        mask=bool(mask))
+                                  for e_state, location, timer, mask in zip(self.e_states,
+                                                                            self.locations,
+                                                                            self.timers,
+                                                                            self.masks)])
+
+    # end - logic #
+
+    @staticmethod
+    def from_population(population: Population):
+        """
+        Convert a list of "Agent" objects into arrays
+        """
+        return ColumnarPopulation(e_states=[int(agent.e_state) for agent in population.agents],
+                                  locations=[agent.location for agent in population.agents],
+                                  timers=[agent.timer for agent in population.agents],
+                                  masks=[agent.mask for agent in population.agents])
+
+    @staticmethod
+    def random(population_count: int,
+               graph: Graph,
+               infect_portion: float = 0.02):
+        """
+        Random amount of individuals, random states, random locations
+        """
+        return ColumnarPopulation(e_states=np.where(np.random.random(population_count) < infect_portion,
+                                                    int(EpidemiologicalState.I),
+                                                    int(EpidemiologicalState.S)),
+                                  locations=np.random.randint(0, graph.get_size(), size=population_count),
+                                  timers=np.zeros(population_count),
+                                  masks=np.zeros(population_count))
+
+    def __hash__(self):
+        return (self.e_states.tobytes(), self.locations.tobytes()).__hash__()
+
+    def __str__(self):
+        return "<ColumnarPopulation: size={}>".format(self.get_size())
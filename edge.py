@@ -5,16 +5,28 @@
 
 class Edge:
     """
-    A edge in the graph
+    A edge in the graph - immutable, as the graph's index is built from its edges
     """
 
     def __init__(self,
                  s_id: int,
                  t_id: int,
                  w: int):
-        self.s_id = s_id
-        self.t_id = t_id
-        self.w = w
+        self._s_id = s_id
+        self._t_id = t_id
+        self._w = w
+
+    @property
+    def s_id(self):
+        return self._s_id
+
+    @property
+    def t_id(self):
+        return self._t_id
+
+    @property
+    def w(self):
+        return self._w
 
     def copy(self):
         return Edge(s_id=self.s_id,
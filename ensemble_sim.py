@@ -0,0 +1,286 @@
+# library imports
+import numpy as np
+
+# project imports
+from graph import Graph
+from pips.pip import PIP
+from pips.control_mask_pip import PIPControlMask
+from walks.walk import Walk
+from sim import Simulator
+from seird_kernel import SEIRDkernel
+from seird_parms import SEIRDparameter
+from columnar_population import ColumnarPopulation
+from epidemiological_state import EpidemiologicalState
+from pips.multi_aggressive_pip import PIPMultiAggressive
+from pips.single_aggressive_pip import PIPSignleAggressive
+
+
+class EnsembleSimulator:
+    """
+    R replicates of the same scenario (graph, walk policy and max time) held as 2-D arrays (replicates x agents) and
+    advanced together with one set of vectorized operations per step.
+    Each replicate has its own population and its own inspection units (PIP), and follows the same logic as the
+    "Simulator" - including freezing once it has no infected agents.
+    Only walks where the agents move independently (see "Walk.INDEPENDENT_MOVES") and the PIP, PIPMultiAggressive and
+    PIPSignleAggressive policies are supported.
+    """
+
+    def __init__(self,
+                 e_states: np.ndarray,
+                 locations: np.ndarray,
+                 timers: np.ndarray,
+                 masks: np.ndarray,
+                 graph: Graph,
+                 walk_policy: Walk,
+                 control_masks: np.ndarray,
+                 found_exposed: np.ndarray,
+                 find_probabilities: np.ndarray,
+                 releases: np.ndarray,
+                 max_time: int):
+        # sim settings
+        self.e_states = np.array(e_states, dtype=ColumnarPopulation.E_STATE_TYPE)
+        self.locations = np.array(locations, dtype=np.int64)
+        self.timers = np.array(timers, dtype=ColumnarPopulation.TIMER_TYPE)
+        self.masks = np.array(masks, dtype=bool)
+        self.graph = graph
+        self.walk_policy = walk_policy
+        # the PIP of each replicate - the nodes with IUs (the outside node included, always False), if found exposed
+        # agents are taken as well, the find probability, and if agents outside the graph are released
+        self.control_masks = np.array(control_masks, dtype=bool)
+        self.found_exposed = np.array(found_exposed, dtype=bool)
+        self.find_probabilities = np.array(find_probabilities, dtype=np.float64)
+        self.releases = np.array(releases, dtype=bool)
+
+        # technical
+        self.max_time = max_time
+
+        # operation
+        self.step = 0
+
+        # later analysis - (replicates x steps x states)
+        self.epi_dist = np.zeros((self.get_replicate_count(), max_time + 1, len(EpidemiologicalState)), dtype=np.int64)
+
+    def get_replicate_count(self) -> int:
+        return self.e_states.shape[0]
+
+    def get_population_size(self) -> int:
+        return self.e_states.shape[1]
+
+    # logic #
+
+    def run(self) -> np.ndarray:
+        """
+        Run all the replicates and return their (replicates x steps x states) epidemiological distribution
+        """
+        while self.step <= self.max_time:
+            self.run_step()
+        return self.epi_dist
+
+    def run_step(self):
+        """
+        Make a single step in time of all the replicates that still have infected agents
+        """
+        # edge case - a replicate without infected agents stays as it is
+        active = np.ones(self.get_replicate_count(), dtype=bool) if self.step == 0 \
+            else self.epi_dist[:, self.step - 1, int(EpidemiologicalState.I)] > 0
+        if np.any(active):
+            agent_active = np.repeat(active, self.get_population_size())
+            self.seird(agent_active=agent_active)
+            self.walk(agent_active=agent_active)
+            self.pip(agent_active=agent_active)
+        # recall state for later
+        self.epi_dist[:, self.step] = self.gather_epi_state()
+        # count this step
+        self.step += 1
+
+    def seird(self,
+              agent_active: np.ndarray):
+        """
+        The SEIRD step of all the nodes of all the replicates at once - each (replicate, node) pair is a segment
+        """
+        node_count = self.graph.get_size()
+        bins = self.get_replicate_count() * (node_count + 1)
+        e_states = self.e_states.reshape(-1)
+        timers = self.timers.reshape(-1)
+        keys = self._segment_keys()
+        masks = self.masks.reshape(-1)
+        is_s = (e_states == EpidemiologicalState.S) & agent_active
+        is_i = (e_states == EpidemiologicalState.I) & agent_active
+        s_count = np.bincount(keys[is_s], minlength=bins)
+        i_count = np.bincount(keys[is_i], minlength=bins)
+        s_mask = np.bincount(keys[is_s & masks], minlength=bins)
+        i_mask = np.bincount(keys[is_i & masks], minlength=bins)
+        infect_counts = np.ceil(SEIRDparameter.beta * s_count * i_count)
+        # reduce infection count due to masks
+        s_mask_rate = np.divide(s_mask, s_count, out=np.zeros(bins), where=s_count > 0) * SEIRDparameter.s_mask_reduction
+        i_mask_rate = np.divide(i_mask, i_count, out=np.zeros(bins), where=i_count > 0) * SEIRDparameter.i_mask_reduction
+        infect_counts *= (1 - s_mask_rate)
+        infect_counts *= (1 - i_mask_rate)
+        infect_counts = np.round(infect_counts).astype(np.int64).reshape(-1, node_count + 1)
+        # no infection outside the graph
+        infect_counts[:, node_count] = 0
+        # frozen replicates have no infections, as their segments are not counted
+        newly_exposed = SEIRDkernel.first_susceptibles(e_states=e_states,
+                                                       locations=keys,
+                                                       infect_counts=infect_counts.reshape(-1))
+        # clock tic
+        timers[agent_active] += 1
+        to_i = np.flatnonzero((e_states == EpidemiologicalState.E) & agent_active & (timers >= SEIRDparameter.phi))
+        to_r_or_d = np.flatnonzero(is_i & (timers >= SEIRDparameter.gamma))
+        is_dead = np.random.random(len(to_r_or_d)) < SEIRDparameter.psi
+        for indices, new_e_state in [(to_i, EpidemiologicalState.I),
+                                     (to_r_or_d[is_dead], EpidemiologicalState.D),
+                                     (to_r_or_d[~is_dead], EpidemiologicalState.R),
+                                     (newly_exposed, EpidemiologicalState.E)]:
+            e_states[indices] = int(new_e_state)
+            timers[indices] = 0
+
+    def walk(self,
+             agent_active: np.ndarray):
+        """
+        Move all the alive agents of all the replicates with one draw from the walk's transition table
+        """
+        locations = self.locations.reshape(-1)
+        movers = np.flatnonzero(agent_active & (self.e_states.reshape(-1) != EpidemiologicalState.D))
+        locations[movers] = self.walk_policy.get_transition_table(graph=self.graph).draw(locations=locations[movers])
+
+    def pip(self,
+            agent_active: np.ndarray):
+        """
+        Take the found infected agents in nodes with IUs out of the graph, and release the ones that are done
+        """
+        outside_node_id = self.graph.get_size()
+        e_states = self.e_states.reshape(-1)
+        locations = self.locations.reshape(-1)
+        replicates = np.repeat(np.arange(self.get_replicate_count()), self.get_population_size())
+        is_i = e_states == EpidemiologicalState.I
+        is_e = e_states == EpidemiologicalState.E
+        candidates = np.flatnonzero(agent_active
+                                    & self.control_masks.reshape(-1)[self._segment_keys()]
+                                    & (is_i | (is_e & self.found_exposed[replicates])))
+        found = candidates[np.random.random(len(candidates)) < self.find_probabilities[replicates[candidates]]]
+        released = np.flatnonzero(agent_active
+                                  & self.releases[replicates]
+                                  & (locations == outside_node_id) & ~is_i & ~is_e)
+        locations[found] = outside_node_id
+        locations[released] = np.random.randint(0, outside_node_id, size=len(released))
+
+    def gather_epi_state(self) -> np.ndarray:
+        """
+        The (replicates x states) epidemiological distribution
+        """
+        state_count = len(EpidemiologicalState)
+        keys = (np.arange(self.get_replicate_count())[:, None] * state_count + self.e_states).reshape(-1)
+        return np.bincount(keys, minlength=self.get_replicate_count() * state_count).reshape(-1, state_count)
+
+    def _segment_keys(self) -> np.ndarray:
+        """
+        The (replicate, node) segment of each agent, as replicate * (node count + 1) + location
+        """
+        return (np.arange(self.get_replicate_count())[:, None] * (self.graph.get_size() + 1) + self.locations).reshape(-1)
+
+    # end - logic #
+
+    # analysis #
+
+    def get_max_infected(self) -> np.ndarray:
+        return self.epi_dist[:, :self.step, int(EpidemiologicalState.I)].max(axis=1)
+
+    def mean_r_zero(self) -> np.ndarray:
+        """
+        The "Simulator.mean_r_zero" of each replicate
+        """
+        infected = self.epi_dist[:, :self.step, int(EpidemiologicalState.I)].astype(np.float64)
+        recovered = self.epi_dist[:, :self.step, int(EpidemiologicalState.R)].astype(np.float64)
+        previous_infected = infected[:, :-1]
+        values = np.where(previous_infected > 0,
+                          infected[:, 1:] - previous_infected + recovered[:, 1:]
+                          - recovered[:, :-1] / np.where(previous_infected > 0, previous_infected, 1),
+                          0)
+        return values.mean(axis=1)
+
+    def get_max_infected_portion(self) -> np.ndarray:
+        return self.get_max_infected() / self.get_population_size()
+
+    def mortality_rate(self) -> np.ndarray:
+        return self.epi_dist[:, self.step - 1, int(EpidemiologicalState.D)] / self.get_population_size()
+
+    # end - analysis #
+
+    @staticmethod
+    def supports(sims: list) -> bool:
+        """
+        Check if the given simulators are replicates of the same scenario that can run together
+        """
+        first = sims[0]
+        if not type(first.walk_policy).INDEPENDENT_MOVES:
+            return False
+        walk_settings = EnsembleSimulator._public_settings(first.walk_policy)
+        first_csr = first.graph.get_csr()
+        for sim in sims:
+            if type(sim.pip) not in (PIP, PIPMultiAggressive, PIPSignleAggressive) \
+                    or type(sim.walk_policy) != type(first.walk_policy) \
+                    or EnsembleSimulator._public_settings(sim.walk_policy) != walk_settings \
+                    or sim.max_time != first.max_time \
+                    or sim.step != 0 \
+                    or sim.population.get_size() != first.population.get_size() \
+                    or sim.graph.get_size() != first.graph.get_size():
+                return False
+            if sim.graph is not first.graph \
+                    and not all(np.array_equal(a, b) for a, b in zip(sim.graph.get_csr(), first_csr)):
+                return False
+        return True
+
+    @staticmethod
+    def from_simulators(sims: list):
+        """
+        Put the given simulators (same graph, walk and max time - but their own population and PIP) in one ensemble
+        """
+        if len(sims) == 0 or not EnsembleSimulator.supports(sims=sims):
+            raise ValueError("EnsembleSimulator.from_simulators: the simulators are not replicates of a supported scenario")
+        populations = [sim.population if isinstance(sim.population, ColumnarPopulation)
+                       else ColumnarPopulation.from_population(population=sim.population)
+                       for sim in sims]
+        node_count = sims[0].graph.get_size()
+        control_masks = np.zeros((len(sims), node_count + 1), dtype=bool)
+        found_exposed = np.zeros(len(sims), dtype=bool)
+        find_probabilities = np.zeros(len(sims))
+        releases = np.zeros(len(sims), dtype=bool)
+        for replicate, sim in enumerate(sims):
+            if not isinstance(sim.pip, PIPControlMask):
+                continue
+            control_masks[replicate] = sim.pip.get_control_mask(node_count=node_count)
+            found_exposed[replicate] = sim.pip.found_exposed
+            find_probabilities[replicate] = sim.pip.find_probability
+            releases[replicate] = True
+        return EnsembleSimulator(e_states=np.stack([population.e_states for population in populations]),
+                                 locations=np.stack([population.locations for population in populations]),
+                                 timers=np.stack([population.timers for population in populations]),
+                                 masks=np.stack([population.masks for population in populations]),
+                                 graph=sims[0].graph,
+                                 walk_policy=sims[0].walk_policy,
+                                 control_masks=control_masks,
+                                 found_exposed=found_exposed,
+                                 find_probabilities=find_probabilities,
+                                 releases=releases,
+                                 max_time=sims[0].max_time)
+
+    @staticmethod
+    def from_simulator(sim: Simulator,
+                       replicates: int):
+        """
+        Repeat the same simulator (same initial population) "replicates" times
+        """
+        return EnsembleSimulator.from_simulators(sims=[sim for _ in range(replicates)])
+
+    @staticmethod
+    def _public_settings(walk_policy: Walk) -> dict:
+        return {key: value for key, value in vars(walk_policy).items() if not key.startswith("_")}
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __str__(self):
+        return "<EnsembleSimulator: R={}, {}/{}>".format(self.get_replicate_count(),
+                                                         self.step,
+                                                         self.max_time)
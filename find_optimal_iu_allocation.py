@@ -1,8 +1,10 @@
 # library imports
 import math
+import heapq
 import random
 import itertools
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 
 # project imports
 from graph import Graph
@@ -10,8 +12,10 @@ from sim import Simulator
 from pips.pip import PIP
 from walks.walk import Walk
 from multi_sim import MultiSim
+from mean_field_sim import MeanFieldSimulator
 from population import Population
 from seird_parms import SEIRDparameter
+from random_streams import RandomStreams
 from epidemiological_state import EpidemiologicalState
 
 
@@ -20,58 +24,300 @@ class OptimalInspectionUnitsAllocation:
     A brute-force approach to find the best IU allocation on a graph
     """
 
+    # CONSTS #
+    # the score of an allocation whose runs give no R0 (NaN)
+    WORST_SCORE = 100
+    BATCH_PER_WORKER = 64
+    # END - CONSTS #
+
+    # the base scenario of a worker process, shipped once when the worker starts
+    _worker_sim = None
+
     def __init__(self):
         pass
 
     @staticmethod
     def simple_brute_force(sim: Simulator,
                            iu_count: int,
-                           repeat_stochastic: int = 1):
+                           repeat_stochastic: int = 1,
+                           workers: int = 1,
+                           chunk_size: int = 1,
+                           common_random_numbers: bool = False,
+                           seed: int = None,
+                           engine: str = MeanFieldSimulator.AGENT_ENGINE):
         """
-        Try (|IU| choose |N|) options (multiplied by Z - a number to reduce stochastic noise)
+        Try (|IU| choose |N|) options (multiplied by Z - a number to reduce stochastic noise).
+        With workers > 1 the options are scored on a pool of processes that get the base scenario once.
+        With common random numbers, all the options are scored on the same "repeat_stochastic" seeded random streams.
+        With the "mean_field" engine, the options are scored on the deterministic surrogate of the scenario.
         """
-        best_score = 100
-        best_allocation = None
-        for allocation in itertools.combinations(list(range(sim.graph.get_size())), iu_count):
-            this_sim = sim.copy()
-            this_sim.allocate_iu(allocation=allocation)
-            allocations_scores = []
-            for _ in range(repeat_stochastic):
-                this_sim_runner = this_sim.copy()
-                this_sim_runner.run()
-                allocations_scores.append(this_sim_runner.mean_r_zero())
-            score = np.mean(allocations_scores)
-            if score < best_score:
-                best_score = score
-                best_allocation = allocation
-        return best_allocation
+        sim = OptimalInspectionUnitsAllocation._base(sim=sim,
+                                                     engine=engine)
+        seeds = MultiSim.replicate_seeds(seed=seed, repeat_times=repeat_stochastic) if common_random_numbers else None
+        allocations = itertools.combinations(list(range(sim.graph.get_size())), iu_count)
+        if workers <= 1:
+            return OptimalInspectionUnitsAllocation._serial_best(sim=sim,
+                                                                 allocations=allocations,
+                                                                 repeat_stochastic=repeat_stochastic,
+                                                                 seeds=seeds)[0]
+        with OptimalInspectionUnitsAllocation._pool(sim=sim, workers=workers) as pool:
+            return OptimalInspectionUnitsAllocation._parallel_best(pool=pool,
+                                                                   allocations=allocations,
+                                                                   repeat_stochastic=repeat_stochastic,
+                                                                   seeds=seeds,
+                                                                   workers=workers,
+                                                                   chunk_size=chunk_size)[0]
 
     @staticmethod
     def greedy_brute_force(sim: Simulator,
                            iu_count: int,
-                           repeat_stochastic: int = 1):
+                           repeat_stochastic: int = 1,
+                           workers: int = 1,
+                           chunk_size: int = 1,
+                           common_random_numbers: bool = False,
+                           seed: int = None,
+                           engine: str = MeanFieldSimulator.AGENT_ENGINE):
         """
-        Try |IU| * |N| options (multiplied by Z - a number to reduce stochastic noise)
+        Try |IU| * |N| options (multiplied by Z - a number to reduce stochastic noise).
+        With workers > 1 the options of each round are scored on a pool of processes that get the base scenario once.
+        With common random numbers, all the options of all the rounds are scored on the same "repeat_stochastic" seeded
+        random streams. With the "mean_field" engine, the options are scored on the deterministic surrogate of the
+        scenario.
         """
+        sim = OptimalInspectionUnitsAllocation._base(sim=sim,
+                                                     engine=engine)
+        seeds = MultiSim.replicate_seeds(seed=seed, repeat_times=repeat_stochastic) if common_random_numbers else None
         best_allocation = []
-        this_sim = sim.copy()
-        for allocation_index in range(iu_count):
-            best_current_score = 100
-            best_new_allocation = None
-            for node_index in range(sim.graph.get_size()):
-                if node_index in best_allocation:
-                    continue
-                this_allocation = best_allocation.copy()
-                this_allocation.append(node_index)
-                this_sim.allocate_iu(allocation=this_allocation)
-                allocations_scores = []
-                for _ in range(repeat_stochastic):
-                    this_sim_runner = this_sim.copy()
-                    this_sim_runner.run()
-                    allocations_scores.append(this_sim_runner.mean_r_zero())
-                score = np.mean(allocations_scores)
-                if score < best_current_score:
-                    best_current_score = score
-                    best_new_allocation = node_index
-            best_allocation.append(best_new_allocation)
+        pool = OptimalInspectionUnitsAllocation._pool(sim=sim, workers=workers) if workers > 1 else None
+        try:
+            for allocation_index in range(iu_count):
+                allocations = (best_allocation + [node_index]
+                               for node_index in range(sim.graph.get_size()) if node_index not in best_allocation)
+                if pool is None:
+                    best_new_allocation, _ = OptimalInspectionUnitsAllocation._serial_best(sim=sim,
+                                                                                           allocations=allocations,
+                                                                                           repeat_stochastic=repeat_stochastic,
+                                                                                           seeds=seeds)
+                else:
+                    best_new_allocation, _ = OptimalInspectionUnitsAllocation._parallel_best(pool=pool,
+                                                                                             allocations=allocations,
+                                                                                             repeat_stochastic=repeat_stochastic,
+                                                                                             seeds=seeds,
+                                                                                             workers=workers,
+                                                                                             chunk_size=chunk_size)
+                best_allocation.append(best_new_allocation[-1] if best_new_allocation is not None else None)
+        finally:
+            if pool is not None:
+                pool.shutdown()
         return best_allocation
+
+    @staticmethod
+    def lazy_greedy(sim: Simulator,
+                    iu_count: int,
+                    repeat_stochastic: int = 1,
+                    workers: int = 1,
+                    chunk_size: int = 1,
+                    common_random_numbers: bool = True,
+                    seed: int = None,
+                    min_gain: float = None,
+                    engine: str = MeanFieldSimulator.AGENT_ENGINE):
+        """
+        The greedy allocation with lazy evaluations (CELF) - the R0 reduction (gain) of adding each node is kept in a
+        priority queue as an upper bound of its gain in later rounds, and each round only re-evaluates the top nodes
+        until the best one is up to date. With "min_gain", stops placing IUs once the best gain falls below it.
+        The bounds are compared across rounds, so common random numbers are on by default.
+        With workers > 1 the evaluations (all the nodes at the first round, the top ones later) run on a pool.
+        With the "mean_field" engine, the options are scored on the deterministic surrogate of the scenario.
+        """
+        sim = OptimalInspectionUnitsAllocation._base(sim=sim,
+                                                     engine=engine)
+        seeds = MultiSim.replicate_seeds(seed=seed, repeat_times=repeat_stochastic) if common_random_numbers else None
+        best_allocation = []
+        pool = OptimalInspectionUnitsAllocation._pool(sim=sim, workers=workers) if workers > 1 else None
+        try:
+            current_score = OptimalInspectionUnitsAllocation._scores(sim=sim,
+                                                                     pool=pool,
+                                                                     allocations=[[]],
+                                                                     repeat_stochastic=repeat_stochastic,
+                                                                     seeds=seeds,
+                                                                     chunk_size=chunk_size)[0]
+            # (-gain, node, the round the gain was computed in)
+            stale_nodes = list(range(sim.graph.get_size()))
+            queue = []
+            for round_index in range(iu_count):
+                while len(stale_nodes) > 0:
+                    scores = OptimalInspectionUnitsAllocation._scores(sim=sim,
+                                                                      pool=pool,
+                                                                      allocations=[best_allocation + [node_index]
+                                                                                   for node_index in stale_nodes],
+                                                                      repeat_stochastic=repeat_stochastic,
+                                                                      seeds=seeds,
+                                                                      chunk_size=chunk_size)
+                    for node_index, score in zip(stale_nodes, scores):
+                        score = score if not math.isnan(score) else OptimalInspectionUnitsAllocation.WORST_SCORE
+                        heapq.heappush(queue, (score - current_score, node_index, round_index))
+                    # the next top nodes whose gain is not up to date, as many as there are workers
+                    stale_nodes = []
+                    while len(queue) > 0 and queue[0][2] != round_index and len(stale_nodes) < max(workers, 1):
+                        stale_nodes.append(heapq.heappop(queue)[1])
+                if len(queue) == 0:
+                    break
+                negative_gain, node_index, _ = queue[0]
+                if min_gain is not None and -negative_gain < min_gain:
+                    break
+                heapq.heappop(queue)
+                best_allocation.append(node_index)
+                current_score += negative_gain
+                # all the gains left in the queue are now upper bounds from earlier rounds
+                stale_nodes = []
+                while len(queue) > 0 and len(stale_nodes) < max(workers, 1):
+                    stale_nodes.append(heapq.heappop(queue)[1])
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        return best_allocation
+
+    @staticmethod
+    def evaluate(sim: Simulator,
+                 allocation,
+                 repeat_stochastic: int = 1,
+                 seeds: list = None) -> float:
+        """
+        The mean R0 of the simulation with the given IU allocation, over "repeat_stochastic" runs (one for a
+        deterministic simulator).
+        Given seeds, run i draws from the random streams of seeds[i] (common random numbers).
+        """
+        this_sim = sim.clone()
+        this_sim.allocate_iu(allocation=allocation)
+        allocations_scores = []
+        for replicate in range(1 if this_sim.DETERMINISTIC else repeat_stochastic):
+            this_sim_runner = this_sim.clone()
+            if seeds is not None:
+                this_sim_runner.random_streams = RandomStreams(seed=seeds[replicate])
+            this_sim_runner.run()
+            allocations_scores.append(this_sim_runner.mean_r_zero())
+        return np.mean(allocations_scores)
+
+    # parallel help functions #
+
+    @staticmethod
+    def _best(allocations_scores):
+        """
+        The first allocation with the lowest score (and this score), from (allocation, score) pairs - NaN scores are
+        never the best
+        """
+        best_score = math.inf
+        best_allocation = None
+        for allocation, score in allocations_scores:
+            if score < best_score:
+                best_score = score
+                best_allocation = allocation
+        return best_allocation, best_score
+
+    @staticmethod
+    def _serial_best(sim: Simulator,
+                     allocations,
+                     repeat_stochastic: int,
+                     seeds: list = None):
+        return OptimalInspectionUnitsAllocation._best(
+            allocations_scores=((allocation, OptimalInspectionUnitsAllocation.evaluate(sim=sim,
+                                                                                       allocation=allocation,
+                                                                                       repeat_stochastic=repeat_stochastic,
+                                                                                       seeds=seeds))
+                                for allocation in allocations))
+
+    @staticmethod
+    def _base(sim: Simulator,
+              engine: str) -> Simulator:
+        """
+        The base scenario every evaluation clones - a columnar copy for the agent engine (cloned with a few array
+        copies) or the mean-field surrogate
+        """
+        if engine == MeanFieldSimulator.AGENT_ENGINE:
+            return sim.clone(columnar=True)
+        return MeanFieldSimulator.with_engine(sim=sim,
+                                              engine=engine)
+
+    @staticmethod
+    def _scores(sim: Simulator,
+                pool: ProcessPoolExecutor,
+                allocations: list,
+                repeat_stochastic: int,
+                seeds: list,
+                chunk_size: int) -> list:
+        """
+        The scores of the given allocations, in order - on the pool if there is one
+        """
+        if pool is None:
+            return [OptimalInspectionUnitsAllocation.evaluate(sim=sim,
+                                                              allocation=allocation,
+                                                              repeat_stochastic=repeat_stochastic,
+                                                              seeds=seeds)
+                    for allocation in allocations]
+        return list(pool.map(OptimalInspectionUnitsAllocation._evaluate_in_worker,
+                             allocations,
+                             itertools.repeat(repeat_stochastic),
+                             itertools.repeat(seeds),
+                             OptimalInspectionUnitsAllocation._task_seeds(count=len(allocations)),
+                             chunksize=chunk_size))
+
+    @staticmethod
+    def _pool(sim: Simulator,
+              workers: int) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=workers,
+                                   initializer=OptimalInspectionUnitsAllocation._init_worker,
+                                   initargs=(sim,))
+
+    @staticmethod
+    def _init_worker(sim: Simulator):
+        OptimalInspectionUnitsAllocation._worker_sim = sim
+
+    @staticmethod
+    def _task_seeds(count: int) -> list:
+        """
+        A seed for each task sent to the pool, drawn from the caller's random state - so a seeded search gives the same
+        scores whichever worker runs each task
+        """
+        return np.random.randint(0, 2 ** 32, size=count, dtype=np.int64).tolist()
+
+    @staticmethod
+    def _evaluate_in_worker(allocation,
+                            repeat_stochastic: int,
+                            seeds: list = None,
+                            task_seed: int = None) -> float:
+        if task_seed is not None:
+            MultiSim.seed_all(seed=task_seed)
+        return OptimalInspectionUnitsAllocation.evaluate(sim=OptimalInspectionUnitsAllocation._worker_sim,
+                                                         allocation=allocation,
+                                                         repeat_stochastic=repeat_stochastic,
+                                                         seeds=seeds)
+
+    @staticmethod
+    def _parallel_best(pool: ProcessPoolExecutor,
+                       allocations,
+                       repeat_stochastic: int,
+                       seeds: list,
+                       workers: int,
+                       chunk_size: int):
+        """
+        Score the allocations on the pool, a bounded batch at a time, and reduce them to the best one (in order)
+        """
+        best_allocation = None
+        best_score = math.inf
+        batch_size = workers * chunk_size * OptimalInspectionUnitsAllocation.BATCH_PER_WORKER
+        while True:
+            batch = list(itertools.islice(allocations, batch_size))
+            if len(batch) == 0:
+                return best_allocation, best_score
+            scores = pool.map(OptimalInspectionUnitsAllocation._evaluate_in_worker,
+                              batch,
+                              itertools.repeat(repeat_stochastic),
+                              itertools.repeat(seeds),
+                              OptimalInspectionUnitsAllocation._task_seeds(count=len(batch)),
+                              chunksize=chunk_size)
+            allocation, score = OptimalInspectionUnitsAllocation._best(allocations_scores=zip(batch, scores))
+            if score < best_score:
+                best_allocation = allocation
+                best_score = score
+
+    # end - parallel help functions #
@@ -1,7 +1,8 @@
 # library imports
-import random
+import os
 import itertools
 import numpy as np
+import pandas as pd
 
 # project imports
 from node import Node
@@ -10,61 +11,399 @@ from edge import Edge
 
 class Graph:
     """
-    A simple graph object - implemented using a list of nodes with IDs and edges of these IDs
+    A simple graph object - implemented using a list of nodes with IDs and edges of these IDs.
+    Neighbor queries are answered from a compressed sparse row (CSR) index of the edges, built on first use and
+    rebuilt only when the edges are set again. The edges are kept as a tuple of (immutable) "Edge" objects so they
+    cannot change behind the index's back - to change them, set a new edges sequence.
+    A graph loaded from arrays or files (see "from_csr" and the loaders) is array-backed - it holds only the CSR index
+    and the "Edge" objects are made the first time the edges list is used.
     """
 
+    # CONSTS #
+    CSR_FILES = ("offsets", "targets", "weights")
+    # the random generators draw at most this many numbers at a time, so a large graph does not hold them all at once
+    RANDOM_CHUNK_SIZE = 2 ** 16
+    # END - CONSTS #
+
     def __init__(self,
                  nodes: list,
                  edges: list):
         self.nodes = nodes
         self.edges = edges
 
+    @property
+    def edges(self):
+        if self._edges is None:
+            # an array-backed graph - make the edge objects, in the order of the index
+            offsets, targets, weights = self._csr
+            s_ids = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+            self._edges = tuple(Edge(s_id=s_id, t_id=t_id, w=w)
+                                for s_id, t_id, w in zip(s_ids.tolist(), targets.tolist(), weights.tolist()))
+        return self._edges
+
+    @edges.setter
+    def edges(self,
+              edges: list):
+        self._edges = tuple(edges)
+        self._csr = None
+
     def get_size(self) -> int:
         return len(self.nodes)
 
+    def get_edge_count(self) -> int:
+        return len(self._edges) if self._edges is not None else len(self._csr[1])
+
     def next_nodes(self,
                    id: int):
-        return [edge.t_id for edge in self.edges if edge.s_id == id]
+        offsets, targets, weights = self.get_csr()
+        if id >= len(offsets) - 1:
+            return []
+        return targets[offsets[id]:offsets[id + 1]].tolist()
 
     def next_nodes_with_weight(self,
                    id: int):
-        ids = []
-        ws = []
-        for edge in self.edges:
-            if edge.s_id == id:
-                ids.append(edge.t_id)
-                ws.append(edge.w)
-        return ids, ws
+        offsets, targets, weights = self.get_csr()
+        if id >= len(offsets) - 1:
+            return [], []
+        return targets[offsets[id]:offsets[id + 1]].tolist(), weights[offsets[id]:offsets[id + 1]].tolist()
+
+    # CSR index #
+
+    def get_csr(self):
+        """
+        The (offsets, targets, weights) CSR index of the edges - the edges going out of node i are
+        targets[offsets[i]:offsets[i+1]] (in the order they appear in the edges list) with the matching weights
+        """
+        if self._csr is None:
+            self._csr = Graph.build_csr(node_count=self.get_size(),
+                                        edges=self._edges)
+        return self._csr
+
+    @staticmethod
+    def build_csr(node_count: int,
+                  edges: list):
+        return Graph.csr_from_arrays(node_count=node_count,
+                                     s_ids=np.fromiter((edge.s_id for edge in edges), dtype=np.int64, count=len(edges)),
+                                     t_ids=np.fromiter((edge.t_id for edge in edges), dtype=np.int64, count=len(edges)),
+                                     weights=np.fromiter((edge.w for edge in edges), dtype=np.float64, count=len(edges)))
+
+    @staticmethod
+    def csr_from_arrays(node_count: int,
+                        s_ids: np.ndarray,
+                        t_ids: np.ndarray,
+                        weights: np.ndarray):
+        """
+        The read-only CSR index of the edges given as (source, target, weight) arrays, keeping the edges' order within
+        each source node
+        """
+        s_ids = np.asarray(s_ids, dtype=np.int64)
+        row_count = max(node_count, int(s_ids.max()) + 1 if len(s_ids) > 0 else 0)
+        order = np.argsort(s_ids, kind="stable")
+        offsets = np.zeros(row_count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(s_ids, minlength=row_count), out=offsets[1:])
+        csr = (offsets, np.asarray(t_ids, dtype=np.int64)[order], np.asarray(weights, dtype=np.float64)[order])
+        [array.setflags(write=False) for array in csr]
+        return csr
+
+    # end - CSR index #
+
+    # loaders #
+
+    @staticmethod
+    def from_csr(offsets: np.ndarray,
+                 targets: np.ndarray,
+                 weights: np.ndarray,
+                 node_count: int = 0):
+        """
+        An array-backed graph with the given CSR index (the arrays are used as they are, e.g., memory-mapped, if they
+        are already int64 / float64), with a node per row and at least "node_count" nodes
+        """
+        offsets = np.asarray(offsets, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        node_count = max(node_count, len(offsets) - 1)
+        csr = (np.concatenate((offsets, np.full(node_count + 1 - len(offsets), offsets[-1], dtype=np.int64)))
+               if len(offsets) - 1 < node_count else offsets,
+               targets,
+               np.asarray(weights, dtype=np.float64))
+        [array.setflags(write=False) for array in csr if array.flags.writeable]
+        return Graph._array_backed(nodes=[Node(id=i) for i in range(node_count)],
+                                   csr=csr)
+
+    @staticmethod
+    def from_arrays(s_ids: np.ndarray,
+                    t_ids: np.ndarray,
+                    weights: np.ndarray = None,
+                    node_count: int = 0):
+        """
+        An array-backed graph of the edges given as source and target arrays (with weights 1 if not given), with a
+        node for every id in them
+        """
+        weights = weights if weights is not None else np.ones(len(s_ids))
+        if len(t_ids) > 0:
+            node_count = max(node_count, int(np.max(t_ids)) + 1)
+        return Graph.from_csr(*Graph.csr_from_arrays(node_count=node_count,
+                                                     s_ids=s_ids,
+                                                     t_ids=t_ids,
+                                                     weights=weights),
+                              node_count=node_count)
+
+    @staticmethod
+    def from_dense(matrix: np.ndarray):
+        """
+        An array-backed graph of a dense weight matrix, with a node per row and an edge for every positive weight (as
+        "table_to_edges")
+        """
+        matrix = np.asarray(matrix, dtype=np.float64)
+        s_ids, t_ids = np.nonzero(matrix > 0)
+        return Graph.from_csr(*Graph.csr_from_arrays(node_count=matrix.shape[0],
+                                                     s_ids=s_ids,
+                                                     t_ids=t_ids,
+                                                     weights=matrix[s_ids, t_ids]))
+
+    @staticmethod
+    def from_edge_list(path: str,
+                       delimiter: str = None,
+                       header: bool = False,
+                       node_count: int = 0):
+        """
+        An array-backed graph of an edge-list text file - a "source target [weight]" line per edge, with integer
+        node ids (lines starting with "#" are ignored). The values are separated by "delimiter", or if it is not given
+        by commas if the first line has one and by whitespace otherwise.
+        """
+        if delimiter is None:
+            delimiter = "," if "," in Graph._first_line(path=path) else r"\s+"
+        table = pd.read_csv(path,
+                            sep=delimiter,
+                            header=0 if header else None,
+                            comment="#",
+                            skipinitialspace=True)
+        return Graph.from_arrays(s_ids=table.iloc[:, 0].to_numpy(dtype=np.int64),
+                                 t_ids=table.iloc[:, 1].to_numpy(dtype=np.int64),
+                                 weights=table.iloc[:, 2].to_numpy(dtype=np.float64) if table.shape[1] > 2 else None,
+                                 node_count=node_count)
+
+    @staticmethod
+    def _first_line(path: str) -> str:
+        """
+        The first line of a text file that is not empty or a comment
+        """
+        with open(path, "r") as text_file:
+            for line in text_file:
+                if line.strip() != "" and not line.lstrip().startswith("#"):
+                    return line
+        return ""
+
+    @staticmethod
+    def from_npz(path: str):
+        """
+        An array-backed graph of a sparse matrix .npz file - either saved by "save_npz" (offsets, targets, weights) or
+        by scipy.sparse.save_npz in the CSR or COO format
+        """
+        with np.load(path, allow_pickle=False) as data:
+            if all(name in data.files for name in Graph.CSR_FILES):
+                return Graph.from_csr(*[data[name] for name in Graph.CSR_FILES])
+            matrix_format = data["format"].item() if "format" in data.files else None
+            matrix_format = matrix_format.decode("ascii") if isinstance(matrix_format, bytes) else matrix_format
+            node_count = int(max(data["shape"])) if "shape" in data.files else 0
+            if matrix_format == "csr":
+                return Graph.from_csr(offsets=data["indptr"],
+                                      targets=data["indices"],
+                                      weights=data["data"],
+                                      node_count=node_count)
+            if matrix_format == "coo":
+                return Graph.from_arrays(s_ids=data["row"],
+                                         t_ids=data["col"],
+                                         weights=data["data"],
+                                         node_count=node_count)
+        raise ValueError("Graph.from_npz: {} is not a CSR or COO sparse matrix".format(path))
+
+    def save_npz(self,
+                 path: str):
+        np.savez(path, **dict(zip(Graph.CSR_FILES, self.get_csr())))
+
+    def save_csr(self,
+                 folder: str):
+        """
+        Save the CSR index as .npy files in the folder, to be loaded memory-mapped by "load_csr"
+        """
+        os.makedirs(folder, exist_ok=True)
+        for name, array in zip(Graph.CSR_FILES, self.get_csr()):
+            np.save(os.path.join(folder, name + ".npy"), array)
+
+    @staticmethod
+    def load_csr(folder: str,
+                 mmap: bool = True):
+        """
+        An array-backed graph of the CSR index saved by "save_csr" - memory-mapped (read on demand) by default
+        """
+        return Graph.from_csr(*[np.load(os.path.join(folder, name + ".npy"), mmap_mode="r" if mmap else None)
+                                for name in Graph.CSR_FILES])
+
+    @staticmethod
+    def _array_backed(nodes: list,
+                      csr: tuple):
+        answer = Graph.__new__(Graph)
+        answer.nodes = nodes
+        answer._edges = None
+        answer._csr = csr
+        return answer
+
+    # end - loaders #
+
+    # generators #
 
     @staticmethod
     def generate_random(node_count: int,
                         edge_count: int):
         """
-        Generate random graph with a given number of nodes and edges
+        Generate random graph with a given number of nodes and edges (see "erdos_renyi")
+        """
+        return Graph.erdos_renyi(node_count=node_count,
+                                 edge_count=edge_count)
+
+    @staticmethod
+    def erdos_renyi(node_count: int,
+                    edge_count: int):
+        """
+        A uniform random directed graph G(n, m) - "edge_count" distinct edges without self loops (at most all of them),
+        sampled without replacement from the indexes of the possible edges
+        """
+        pair_count = node_count * (node_count - 1)
+        keys = Graph._sample_keys(population=pair_count,
+                                  count=min(edge_count, pair_count))
+        s_ids = keys // max(node_count - 1, 1)
+        t_ids = keys % max(node_count - 1, 1)
+        # skip the source itself
+        t_ids += t_ids >= s_ids
+        return Graph.from_arrays(s_ids=s_ids,
+                                 t_ids=t_ids,
+                                 node_count=node_count)
+
+    @staticmethod
+    def _sample_keys(population: int,
+                     count: int) -> np.ndarray:
+        """
+        "count" distinct integers picked uniformly from range(population) - vectorized draws with the repeats removed,
+        or the ones to leave out if most of them are picked
         """
-        nodes = [Node(id=i) for i in range(node_count)]
-        edges = []
-        while len(edges) < edge_count:
-            s_id = random.randint(0, node_count-1)
-            t_id = random.randint(0, node_count-1)
-            if s_id != t_id and Edge(s_id=s_id, t_id=t_id, w=0) not in edges:
-                edges.append(Edge(s_id=s_id, t_id=t_id, w=1))
-        return Graph(nodes=nodes,
-                     edges=edges)
+        if count > population // 2:
+            return np.setdiff1d(np.arange(population, dtype=np.int64),
+                                Graph._sample_keys(population=population,
+                                                   count=population - count),
+                                assume_unique=True)
+        keys = np.empty(0, dtype=np.int64)
+        while len(keys) < count:
+            keys = np.unique(np.concatenate((keys, np.random.randint(0, population, count - len(keys), dtype=np.int64))))
+        return np.random.permutation(keys)[:count]
 
     @staticmethod
     def fully_connected(node_count: int):
         """
         Generate a fully connected graph with a given number of nodes
         """
-        nodes = [Node(id=i) for i in range(node_count)]
-        edges = []
-        for i in range(node_count):
-            for j in range(node_count):
-                if i != j:
-                    edges.append(Edge(s_id=i, t_id=j, w=1))
-        return Graph(nodes=nodes,
-                     edges=edges)
+        s_ids = np.repeat(np.arange(node_count), max(node_count - 1, 0))
+        t_ids = np.tile(np.arange(max(node_count - 1, 0)), node_count)
+        t_ids += t_ids >= s_ids
+        return Graph.from_arrays(s_ids=s_ids,
+                                 t_ids=t_ids,
+                                 node_count=node_count)
+
+    @staticmethod
+    def barabasi_albert(node_count: int,
+                        attach_count: int):
+        """
+        A Barabasi-Albert preferential attachment graph - every new node links to "attach_count" distinct older nodes,
+        picked with probability proportional to their degree. The links are undirected (an edge in each direction).
+        """
+        link_count = attach_count * max(0, node_count - attach_count)
+        s_ids = np.repeat(np.arange(attach_count, max(attach_count, node_count), dtype=np.int64), attach_count)
+        t_ids = np.empty(link_count, dtype=np.int64)
+        # every node appears once per link it has, so a uniform pick from it is a pick by degree
+        repeated_nodes = []
+        targets = list(range(attach_count))
+        uniforms = np.empty(0)
+        position = 0
+        for node_id in range(attach_count, node_count):
+            link_start = (node_id - attach_count) * attach_count
+            t_ids[link_start:link_start + attach_count] = targets
+            repeated_nodes.extend(targets)
+            repeated_nodes.extend([node_id] * attach_count)
+            chosen = set()
+            while len(chosen) < attach_count:
+                if position == len(uniforms):
+                    uniforms = np.random.random(min(Graph.RANDOM_CHUNK_SIZE, 2 * attach_count * (node_count - node_id)))
+                    position = 0
+                picks = uniforms[position:position + attach_count - len(chosen)]
+                position += len(picks)
+                chosen.update(repeated_nodes[int(uniform * len(repeated_nodes))] for uniform in picks.tolist())
+            targets = list(chosen)
+        return Graph.from_arrays(s_ids=np.concatenate((s_ids, t_ids)),
+                                 t_ids=np.concatenate((t_ids, s_ids)),
+                                 node_count=node_count)
+
+    @staticmethod
+    def watts_strogatz(node_count: int,
+                       neighbor_count: int,
+                       rewire_probability: float):
+        """
+        A Watts-Strogatz small world graph - a ring where every node links to its "neighbor_count" nearest nodes
+        ("neighbor_count" / 2 on each side), and then each link is moved to a random new end with the given probability
+        (unless it would make a self loop or a parallel link). The links are undirected (an edge in each direction).
+        """
+        half = neighbor_count // 2
+        s_ids = np.repeat(np.arange(node_count), half)
+        t_ids = (s_ids + np.tile(np.arange(1, half + 1), node_count)) % node_count
+        rewired = np.flatnonzero(np.random.random(len(s_ids)) < rewire_probability)
+        new_t_ids = np.random.randint(0, node_count, len(rewired))
+        links = set(zip(np.minimum(s_ids, t_ids).tolist(), np.maximum(s_ids, t_ids).tolist()))
+        for index, s_id, new_t_id in zip(rewired.tolist(), s_ids[rewired].tolist(), new_t_ids.tolist()):
+            link = (min(s_id, new_t_id), max(s_id, new_t_id))
+            if s_id == new_t_id or link in links:
+                continue
+            links.discard((min(s_id, int(t_ids[index])), max(s_id, int(t_ids[index]))))
+            links.add(link)
+            t_ids[index] = new_t_id
+        return Graph.from_arrays(s_ids=np.concatenate((s_ids, t_ids)),
+                                 t_ids=np.concatenate((t_ids, s_ids)),
+                                 node_count=node_count)
+
+    @staticmethod
+    def gravity(node_count: int,
+                degree: int,
+                masses: np.ndarray = None,
+                positions: np.ndarray = None,
+                distance_power: float = 2,
+                block_size: int = 1024):
+        """
+        A weighted gravity model graph - the pull between two nodes is mass_i * mass_j / distance^distance_power, every
+        node links to the "degree" nodes that pull it the most and the weights of its links are their share of its
+        pull. The masses and the positions (in the unit square) are random unless given.
+        The pulls are computed for a block of nodes at a time, so the memory is O(block_size * node_count).
+        """
+        masses = np.asarray(masses, dtype=np.float64) if masses is not None else np.random.pareto(2, node_count) + 1
+        positions = np.asarray(positions, dtype=np.float64) if positions is not None else np.random.random((node_count, 2))
+        degree = min(degree, node_count - 1)
+        s_ids = np.repeat(np.arange(node_count), degree)
+        t_ids = np.empty(len(s_ids), dtype=np.int64)
+        weights = np.empty(len(s_ids), dtype=np.float64)
+        for start in range(0, node_count if degree > 0 else 0, block_size):
+            rows = np.arange(start, min(start + block_size, node_count))
+            square_distances = np.maximum(np.square(positions[rows, 0, None] - positions[None, :, 0])
+                                          + np.square(positions[rows, 1, None] - positions[None, :, 1]), 1e-24)
+            pulls = masses[rows, None] * masses[None, :] / (square_distances if distance_power == 2
+                                                            else square_distances ** (distance_power / 2))
+            pulls[np.arange(len(rows)), rows] = -1
+            nearest = np.argpartition(-pulls, degree - 1, axis=1)[:, :degree]
+            nearest_pulls = np.take_along_axis(pulls, nearest, axis=1)
+            block = slice(start * degree, (start + len(rows)) * degree)
+            t_ids[block] = nearest.reshape(-1)
+            weights[block] = (nearest_pulls / nearest_pulls.sum(axis=1, keepdims=True)).reshape(-1)
+        return Graph.from_arrays(s_ids=s_ids,
+                                 t_ids=t_ids,
+                                 weights=weights,
+                                 node_count=node_count)
+
+    # end - generators #
 
     @staticmethod
     def table_to_edges(data: np.ndarray):
@@ -74,8 +413,14 @@ class Graph:
         return list(itertools.chain.from_iterable(edges))
 
     def copy(self):
-        return Graph(nodes=[node.copy() for node in self.nodes],
-                     edges=[edge.copy() for edge in self.edges])
+        if self._edges is None:
+            return Graph._array_backed(nodes=[node.copy() for node in self.nodes],
+                                       csr=self._csr)
+        answer = Graph(nodes=[node.copy() for node in self.nodes],
+                       edges=[edge.copy() for edge in self.edges])
+        # the index is read-only, so it can be shared with the copy
+        answer._csr = self._csr
+        return answer
 
     def __hash__(self):
         return (self.nodes, self.edges).__hash__()
@@ -85,4 +430,4 @@ class Graph:
 
     def __str__(self):
         return "<Graph: V={}, E={}>".format(len(self.nodes),
-                                            len(self.edges))
+                                            self.get_edge_count())
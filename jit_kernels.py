@@ -0,0 +1,164 @@
+# library imports
+import numpy as np
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# project imports
+
+
+def _jit(function):
+    """
+    Compile the function with numba if it is installed, otherwise leave it as is (and do not use it, see "JitKernels")
+    """
+    return njit(cache=True, nogil=True)(function) if njit is not None else function
+
+
+@_jit
+def _first_susceptibles(e_states, locations, infect_counts, s_state):
+    bins = len(infect_counts)
+    taken = np.zeros(bins, dtype=np.int64)
+    selected = np.zeros(len(e_states), dtype=np.bool_)
+    for index in range(len(e_states)):
+        if e_states[index] == s_state:
+            location = locations[index]
+            if taken[location] < infect_counts[location]:
+                taken[location] += 1
+                selected[index] = True
+    # ordered by location and then by index, as the sort of the NumPy path
+    starts = np.zeros(bins + 1, dtype=np.int64)
+    for node_id in range(bins):
+        starts[node_id + 1] = starts[node_id] + taken[node_id]
+    answer = np.empty(starts[bins], dtype=np.int64)
+    for index in range(len(e_states)):
+        if selected[index]:
+            location = locations[index]
+            answer[starts[location]] = index
+            starts[location] += 1
+    return answer
+
+
+@_jit
+def _normalized_density_walk(locations, loc_counters, offsets, targets, population_size, default_id):
+    row_count = len(offsets) - 1
+    for position in range(len(locations)):
+        location = locations[position]
+        if location >= row_count or offsets[location] == offsets[location + 1]:
+            continue
+        # the next nodes and then the agent's own node, the first emptiest one wins
+        min_pop_count = population_size + 1
+        min_pop_id = default_id
+        for option in range(offsets[location], offsets[location + 1] + 1):
+            possible_location = targets[option] if option < offsets[location + 1] else location
+            if loc_counters[possible_location] < min_pop_count:
+                min_pop_count = loc_counters[possible_location]
+                min_pop_id = possible_location
+        loc_counters[min_pop_id] += 1
+        loc_counters[location] -= 1
+        locations[position] = min_pop_id
+    return locations
+
+
+@_jit
+def _social_distance_walk(locations, obeys, uniforms, loc_counters, offsets, targets, batched):
+    row_count = len(offsets) - 1
+    for position in range(len(locations)):
+        obey = obeys[position]
+        if not obey and batched:
+            continue
+        location = locations[position]
+        start = offsets[location] if location < row_count else 0
+        end = offsets[location + 1] if location < row_count else 0
+        if obey:
+            # the next nodes and then the agent's own node, the first most crowded one wins
+            best_node = 0
+            best_node_size = 0
+            for option in range(start, end + 1):
+                node_id = targets[option] if option < end else location
+                if best_node_size < loc_counters[node_id]:
+                    best_node = node_id
+                    best_node_size = loc_counters[node_id]
+        elif end > start:
+            option = start + int(uniforms[position] * (end - start + 1))
+            best_node = targets[option] if option < end else location
+        else:
+            continue
+        loc_counters[location] -= 1
+        loc_counters[best_node] += 1
+        locations[position] = best_node
+    return locations
+
+
+class JitKernels:
+    """
+    Compiled (numba) versions of the per-agent loops of the simulation that cannot be vectorized exactly - the
+    sequential walks, where each agent sees the moves of the agents before it, and the pick of the first susceptible
+    agents of each node in the SEIRD step.
+    They work on the arrays of a columnar population and give exactly the results of the pure Python / NumPy code.
+    numba is optional - if it is not installed "ENABLED" is False and the callers keep their own Python / NumPy path.
+    """
+
+    # CONSTS #
+    AVAILABLE = njit is not None
+    # set to False to compare with (or debug) the Python / NumPy path
+    ENABLED = AVAILABLE
+    # END - CONSTS #
+
+    def __init__(self):
+        pass
+
+    @staticmethod
+    def first_susceptibles(e_states: np.ndarray,
+                           locations: np.ndarray,
+                           infect_counts: np.ndarray,
+                           s_state: int) -> np.ndarray:
+        """
+        The indexes of the first "infect_counts[node]" agents in the "s_state" state of each node, in one pass
+        """
+        return _first_susceptibles(e_states,
+                                   np.asarray(locations, dtype=np.int64),
+                                   np.asarray(infect_counts, dtype=np.int64),
+                                   int(s_state))
+
+    @staticmethod
+    def normalized_density_walk(locations: np.ndarray,
+                                loc_counters: np.ndarray,
+                                offsets: np.ndarray,
+                                targets: np.ndarray,
+                                population_size: int,
+                                default_id: int) -> np.ndarray:
+        """
+        The sequential "fill the emptiest neighbor" walk of "WalkNormalizedDensity"
+        """
+        return _normalized_density_walk(np.array(locations, dtype=np.int64),
+                                        np.array(loc_counters, dtype=np.int64),
+                                        np.asarray(offsets, dtype=np.int64),
+                                        np.asarray(targets, dtype=np.int64),
+                                        population_size,
+                                        default_id)
+
+    @staticmethod
+    def social_distance_walk(locations: np.ndarray,
+                             obeys: np.ndarray,
+                             uniforms: np.ndarray,
+                             loc_counters: np.ndarray,
+                             offsets: np.ndarray,
+                             targets: np.ndarray,
+                             batched: bool) -> np.ndarray:
+        """
+        The sequential walk of "WalkSocialDistance"
+        """
+        return _social_distance_walk(np.array(locations, dtype=np.int64),
+                                     np.asarray(obeys, dtype=np.bool_),
+                                     np.asarray(uniforms, dtype=np.float64),
+                                     np.array(loc_counters, dtype=np.int64),
+                                     np.asarray(offsets, dtype=np.int64),
+                                     np.asarray(targets, dtype=np.int64),
+                                     batched)
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __str__(self):
+        return "<JitKernels: {}>".format("numba" if JitKernels.ENABLED else "disabled")
@@ -19,6 +19,9 @@ class Main:
     """
 
     RESULTS_FOLDER = os.path.join(os.path.dirname(__file__), "results")
+    WORKERS = os.cpu_count()
+    # the parallel runs are seeded, so their answers do not depend on the number of workers and can be reproduced
+    SEED = 0
 
     def __init__(self):
         pass
@@ -127,7 +130,9 @@ class Main:
                                                       edge_count=edge_count,
                                                       max_time=max_time,
                                                       control_units=control_units,
-                                                      population_count=population_count)
+                                                      population_count=population_count,
+                                                      workers=Main.WORKERS,
+                                                      seed=Main.SEED)
             means.append(np.mean(max_infected_values_random))
             stds.append(np.std(max_infected_values_random))
             labels.append("{}".format(edge_count))
@@ -140,7 +145,9 @@ class Main:
                                                  edge_count=node_count*node_count,
                                                  max_time=max_time,
                                                  control_units=control_units,
-                                                 population_count=population_count)
+                                                 population_count=population_count,
+                                                 workers=Main.WORKERS,
+                                                 seed=Main.SEED)
         means.append(np.mean(max_infected_values_fully))
         stds.append(np.std(max_infected_values_fully))
         labels.append("{}".format(node_count*node_count))
@@ -177,7 +184,9 @@ class Main:
                                                       edge_count=round(node_count*node_count/10),
                                                       max_time=max_time,
                                                       control_units=control_units,
-                                                      population_count=population_count)
+                                                      population_count=population_count,
+                                                      workers=Main.WORKERS,
+                                                      seed=Main.SEED)
             means.append(np.mean(max_infected_values_random))
             stds.append(np.std(max_infected_values_random))
             labels.append("{:.2f}".format(control_units/node_count))
@@ -0,0 +1,255 @@
+# library imports
+import numpy as np
+
+# project imports
+from graph import Graph
+from pips.pip import PIP
+from pips.control_mask_pip import PIPControlMask
+from walks.walk import Walk
+from sim import Simulator
+from population import Population
+from walks.transition_table import TransitionTable
+from seird_parms import SEIRDparameter
+from transition_calendar import TransitionCalendar
+from columnar_population import ColumnarPopulation
+from epidemiological_state import EpidemiologicalState
+from pips.multi_aggressive_pip import PIPMultiAggressive
+from pips.single_aggressive_pip import PIPSignleAggressive
+
+
+class MeanFieldSimulator(Simulator):
+    """
+    A deterministic surrogate of the "Simulator" - the expected number of agents of each epidemiological state in each
+    node is propagated instead of the agents themselves, so a run costs a few array operations per step.
+    E and I are held as cohorts by their timer, so they last ceil(phi) and ceil(gamma) steps as in the agent model.
+    The walk is one sparse matrix-vector product per step with the walk's transition probabilities, and the PIP moves
+    the expected found portion of the controlled nodes outside the graph.
+    Differences from the agent model: infections are the expected beta * S * I (no rounding up to whole agents) and the
+    mask reduction uses the population's mask portion in every node.
+    The same walks and PIPs as in the "EnsembleSimulator" are supported.
+    """
+
+    # CONSTS #
+    AGENT_ENGINE = "agent"
+    MEAN_FIELD_ENGINE = "mean_field"
+
+    # the same scenario always gives the same result, so there is no need to repeat it
+    DETERMINISTIC = True
+
+    # the records hold expected (fractional) numbers of agents
+    EPI_DIST_TYPE = np.float64
+    NODE_DIST_TYPE = np.float64
+
+    # E and I die out once less than this (expected) number of agents is left in them, as a whole agent would
+    EXTINCT_COUNT = 0.5
+    # END - CONSTS #
+
+    def __init__(self,
+                 population: Population,
+                 graph: Graph,
+                 walk_policy: Walk,
+                 pip: PIP,
+                 max_time: int):
+        Simulator.__init__(self,
+                           population=population,
+                           graph=graph,
+                           walk_policy=walk_policy,
+                           pip=pip,
+                           max_time=max_time)
+        if not type(walk_policy).INDEPENDENT_MOVES:
+            raise ValueError("MeanFieldSimulator: the walk {} has no transition table".format(walk_policy))
+        if type(pip) not in (PIP, PIPMultiAggressive, PIPSignleAggressive):
+            raise ValueError("MeanFieldSimulator: the PIP {} is not supported".format(pip))
+        columnar = population if isinstance(population, ColumnarPopulation) \
+            else ColumnarPopulation.from_population(population=population)
+        node_count = graph.get_size() + 1
+        e_delay = max(TransitionCalendar.delay(e_state=EpidemiologicalState.E), 1)
+        i_delay = max(TransitionCalendar.delay(e_state=EpidemiologicalState.I), 1)
+        # the expected number of agents - (node) for S, R and D and (timer x node) for E and I
+        timers = columnar.timers.astype(np.int64)
+        self.s = MeanFieldSimulator._count(columnar=columnar, e_state=EpidemiologicalState.S, node_count=node_count)
+        self.e = MeanFieldSimulator._cohorts(columnar=columnar, e_state=EpidemiologicalState.E, timers=timers,
+                                             delay=e_delay, node_count=node_count)
+        self.i = MeanFieldSimulator._cohorts(columnar=columnar, e_state=EpidemiologicalState.I, timers=timers,
+                                             delay=i_delay, node_count=node_count)
+        self.r = MeanFieldSimulator._count(columnar=columnar, e_state=EpidemiologicalState.R, node_count=node_count)
+        self.d = MeanFieldSimulator._count(columnar=columnar, e_state=EpidemiologicalState.D, node_count=node_count)
+        self.mask_portion = float(np.mean(columnar.masks)) if columnar.get_size() > 0 else 0
+        # (rows, targets, probabilities) of the walk, with the graph's CSR it was built from
+        self._transitions = None
+        self._transitions_csr = None
+
+    # logic #
+
+    def seird_step(self):
+        """
+        Expected infections in each node, and the E and I cohorts grow older by one step (and die out below
+        "EXTINCT_COUNT" agents)
+        """
+        outside_node_id = self.graph.get_size()
+        infect = SEIRDparameter.beta * self.s * self.i.sum(axis=0)
+        # reduce infection count due to masks
+        infect *= (1 - self.mask_portion * SEIRDparameter.s_mask_reduction)
+        infect *= (1 - self.mask_portion * SEIRDparameter.i_mask_reduction)
+        infect = np.minimum(infect, self.s)
+        # no infection outside the graph
+        infect[outside_node_id] = 0
+        to_i = self.e[-1]
+        to_r_or_d = self.i[-1]
+        self.s = self.s - infect
+        self.e = np.vstack((infect[None, :], self.e[:-1]))
+        self.i = np.vstack((to_i[None, :], self.i[:-1]))
+        self.r = self.r + (1 - SEIRDparameter.psi) * to_r_or_d
+        self.d = self.d + SEIRDparameter.psi * to_r_or_d
+        # the cohorts only decay geometrically, so cut them to exactly 0 (the "no infected left" state of "run" and
+        # "mean_r_zero") once there is less than an agent in them
+        for cohorts in (self.e, self.i):
+            if cohorts.sum() < MeanFieldSimulator.EXTINCT_COUNT:
+                cohorts[:] = 0
+
+    def walk_step(self):
+        """
+        Move all the alive states with one sparse matrix-vector product (dead agents stay in place)
+        """
+        rows, targets, probabilities = self.get_transitions()
+        moving = np.vstack((self.s[None, :], self.e, self.i, self.r[None, :]))
+        state_count, node_count = moving.shape
+        keys = (np.arange(state_count)[:, None] * node_count + targets[None, :]).reshape(-1)
+        moved = np.bincount(keys,
+                            weights=(moving[:, rows] * probabilities).reshape(-1),
+                            minlength=state_count * node_count).reshape(state_count, node_count)
+        self.s = moved[0]
+        self.e = moved[1:1 + len(self.e)]
+        self.i = moved[1 + len(self.e):-1]
+        self.r = moved[-1]
+
+    def pip_step(self):
+        """
+        Take the expected found E/I agents in the nodes with IUs out of the graph, and release the ones that are done
+        uniformly over the graph
+        """
+        if not isinstance(self.pip, PIPControlMask):
+            return
+        outside_node_id = self.graph.get_size()
+        control_mask = self.pip.get_control_mask(node_count=outside_node_id)
+        # release the agents outside the graph that are not E or I
+        for state in (self.s, self.r, self.d):
+            state[:outside_node_id] += state[outside_node_id] / outside_node_id
+            state[outside_node_id] = 0
+        for cohorts in ([self.i, self.e] if self.pip.found_exposed else [self.i]):
+            found = cohorts[:, control_mask] * self.pip.find_probability
+            cohorts[:, control_mask] -= found
+            cohorts[:, outside_node_id] += found.sum(axis=1)
+
+    def gather_epi_state(self):
+        """
+        The expected epidemiological distribution
+        """
+        return [float(self.s.sum()), float(self.e.sum()), float(self.i.sum()), float(self.r.sum()), float(self.d.sum())]
+
+    def gather_node_state(self):
+        """
+        The expected epidemiological distribution of each node
+        """
+        return np.stack((self.s, self.e.sum(axis=0), self.i.sum(axis=0), self.r, self.d), axis=1)
+
+    def _locations(self):
+        """
+        There are no agents to follow, so the profiler counts only the expected infections
+        """
+        return None
+
+    def get_transitions(self):
+        """
+        The (rows, targets, probabilities) of the walk on the graph, where a node without options keeps its agents.
+        Built again only if the graph's edges changed.
+        """
+        csr = self.graph.get_csr()
+        if self._transitions is None or self._transitions_csr is not csr:
+            node_count = self.graph.get_size() + 1
+            offsets, targets, weights = self.walk_policy.transition_weights(graph=self.graph)
+            offsets = TransitionTable.pad_rows(offsets=offsets,
+                                               row_count=node_count)
+            rows = np.repeat(np.arange(node_count), np.diff(offsets))
+            weights = np.asarray(weights, dtype=np.float64)
+            totals = np.bincount(rows, weights=weights, minlength=node_count)
+            probabilities = weights / np.where(totals > 0, totals, 1)[rows]
+            stay_rows = np.flatnonzero(totals <= 0)
+            self._transitions = (np.concatenate((rows, stay_rows)),
+                                 np.concatenate((np.asarray(targets, dtype=np.int64), stay_rows)),
+                                 np.concatenate((probabilities, np.ones(len(stay_rows)))))
+            self._transitions_csr = csr
+        return self._transitions
+
+    # end - logic #
+
+    def clone(self,
+              columnar: bool = False):
+        """
+        A snapshot of the simulator that continues on its own - the graph, walk policy and PIP are shared and only the
+        expected counts, the step and the records (in memory) are copied
+        """
+        answer = MeanFieldSimulator.__new__(MeanFieldSimulator)
+        answer.__dict__.update(self.__dict__)
+        for name in ["s", "e", "i", "r", "d", "_epi_dist"]:
+            setattr(answer, name, getattr(self, name).copy())
+        answer._node_dist = np.array(self._node_dist) if self._node_dist is not None else None
+        answer._node_dist_path = None
+        answer.profiler = None
+        return answer
+
+    def copy(self):
+        return MeanFieldSimulator(population=self.population.copy(),
+                                  graph=self.graph.copy(),
+                                  walk_policy=self.walk_policy,
+                                  pip=self.pip,
+                                  max_time=self.max_time)
+
+    @staticmethod
+    def from_simulator(sim: Simulator):
+        """
+        The mean-field surrogate of the given simulator, starting from its population
+        """
+        return MeanFieldSimulator(population=sim.population,
+                                  graph=sim.graph,
+                                  walk_policy=sim.walk_policy,
+                                  pip=sim.pip,
+                                  max_time=sim.max_time)
+
+    @staticmethod
+    def with_engine(sim: Simulator,
+                    engine: str) -> Simulator:
+        """
+        The simulator to run for the given engine - "agent" (the simulator itself) or "mean_field" (its surrogate)
+        """
+        if engine == MeanFieldSimulator.AGENT_ENGINE:
+            return sim
+        if engine == MeanFieldSimulator.MEAN_FIELD_ENGINE:
+            return MeanFieldSimulator.from_simulator(sim=sim)
+        raise ValueError("MeanFieldSimulator.with_engine: unknown engine '{}'".format(engine))
+
+    @staticmethod
+    def _count(columnar: ColumnarPopulation,
+               e_state: EpidemiologicalState,
+               node_count: int) -> np.ndarray:
+        return np.bincount(columnar.locations[columnar.e_states == e_state],
+                           minlength=node_count)[:node_count].astype(np.float64)
+
+    @staticmethod
+    def _cohorts(columnar: ColumnarPopulation,
+                 e_state: EpidemiologicalState,
+                 timers: np.ndarray,
+                 delay: int,
+                 node_count: int) -> np.ndarray:
+        in_state = columnar.e_states == e_state
+        ages = np.minimum(timers[in_state], delay - 1)
+        return np.bincount(ages * node_count + columnar.locations[in_state],
+                           minlength=delay * node_count)[:delay * node_count].reshape(delay, node_count).astype(np.float64)
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __str__(self):
+        return "<MeanFieldSim: {}/{} ({:.2f}\%)>".format(self.step,
+                                                         self.max_time,
+                                                         100 * self.step / self.max_time)
@@ -1,7 +1,13 @@
 # library imports
 import os
+import math
+import random
+import numpy as np
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
 
 # project imports
+from mean_field_sim import MeanFieldSimulator
 
 
 class MultiSim:
@@ -22,14 +28,65 @@ class MultiSim:
             edge_count: int,
             max_time: int,
             control_units: int,
-            population_count: int):
-        answer = []
-        for _ in range(repeat_times):
-            sim = sim_generator_function(node_count=node_count,
-                                         edge_count=edge_count,
-                                         max_time=max_time,
-                                         control_units=control_units,
-                                         population_count=population_count)
-            sim.run()
-            answer.append(sim_info_extraction_function(sim))
-        return answer
+            population_count: int,
+            workers: int = 1,
+            seed: int = None,
+            chunk_size: int = None,
+            engine: str = MeanFieldSimulator.AGENT_ENGINE):
+        """
+        Run "repeat_times" independent simulations, one after the other or (if workers > 1) on a pool of processes.
+        Given a seed, each replicate is seeded by its own index so the answers are the same for any number of workers.
+        The answers are always in the order of the replicates.
+        With the "mean_field" engine, each generated simulator is replaced by its deterministic surrogate.
+        """
+        settings = {"node_count": node_count,
+                    "edge_count": edge_count,
+                    "max_time": max_time,
+                    "control_units": control_units,
+                    "population_count": population_count}
+        run_replicate = partial(MultiSim.run_replicate,
+                                sim_generator_function,
+                                sim_info_extraction_function,
+                                settings,
+                                engine=engine)
+        if workers <= 1:
+            seeds = MultiSim.replicate_seeds(seed=seed, repeat_times=repeat_times) if seed is not None else [None] * repeat_times
+            return [run_replicate(replicate_seed) for replicate_seed in seeds]
+        # the workers must not share the parent's random state, so an unseeded run gets fresh seeds
+        seeds = MultiSim.replicate_seeds(seed=seed, repeat_times=repeat_times)
+        if chunk_size is None:
+            chunk_size = max(1, math.ceil(repeat_times / (4 * workers)))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(run_replicate, seeds, chunksize=chunk_size))
+
+    @staticmethod
+    def run_replicate(sim_generator_function,
+                      sim_info_extraction_function,
+                      settings: dict,
+                      seed: int = None,
+                      engine: str = MeanFieldSimulator.AGENT_ENGINE):
+        """
+        Generate, run and extract the information of a single simulation
+        """
+        if seed is not None:
+            MultiSim.seed_all(seed=seed)
+        sim = MeanFieldSimulator.with_engine(sim=sim_generator_function(**settings),
+                                             engine=engine)
+        sim.run()
+        return sim_info_extraction_function(sim)
+
+    @staticmethod
+    def replicate_seeds(seed: int,
+                        repeat_times: int) -> list:
+        """
+        Independent seeds for each replicate, derived from a single seed (fresh entropy if None)
+        """
+        return np.random.SeedSequence(seed).generate_state(repeat_times).tolist()
+
+    @staticmethod
+    def seed_all(seed: int):
+        """
+        Seed both random number generators the simulation uses
+        """
+        random.seed(seed)
+        np.random.seed(seed)
@@ -7,7 +7,12 @@ import pandas as pd
 
 # project imports
 from sim import Simulator
+from sweep import Sweep
 from plotter import Plotter
+from multi_sim import MultiSim
+from result_cache import ResultCache
+from adaptive_runner import AdaptiveRunner
+from ensemble_sim import EnsembleSimulator
 from sim_generator import SimulatorGenerator
 from pips.multi_aggressive_pip import PIPMultiAggressive
 from walks.walk_social_distance import WalkSocialDistance
@@ -24,12 +29,26 @@ class Paper:
     SAMLL_REPEAT = 100
     LARGE_REPEAT = SAMLL_REPEAT * 10
     DEFAULT_POPULATION_SIZE = 1000
+    # sequential sampling of each cell - replicates are added until the CI half-width of the metric is small enough
+    ADAPTIVE_MIN_REPEAT = 10
+    ADAPTIVE_BATCH_SIZE = 10
+    CI_HALF_WIDTH = {"r_zero": 0.1, "max_infected": 0.01}
+    CI_RELATIVE_HALF_WIDTH = 0.05
+    WORKERS = os.cpu_count()
 
     PAPER_PLOTS_FOLDER = "paper_results"
     PAPER_PLOTS_PATH = os.path.join(os.path.dirname(__file__), PAPER_PLOTS_FOLDER)
 
+    # the replicates are seeded from SEED and their outcomes are kept on disk, so a figure is computed only once
+    SEED = 0
+    USE_CACHE = True
+    CACHE_PATH = os.path.join(PAPER_PLOTS_PATH, "cache")
+    CACHE_MAX_BYTES = 2 * 1024 ** 3
+
     # END - CONSTS #
 
+    _cache = None
+
     def __init__(self):
         pass
 
@@ -73,48 +92,32 @@ class Paper:
                 "population_density": [0.5 * i for i in range(21)],
                 "population_mobility": [0.1 * i for i in range(11)],
                 "iu_performance": [0.05 * i for i in range(21)]}
-        for metric_index, metric_name in enumerate(["r_zero", "max_infected"]):
-            for index, parameter in enumerate(parameter_list):
-                parameter_mean_row = []
-                parameter_std_row = []
-                for portion_index, portion in enumerate(cols[parameter]):
-                    metric = []
-                    for i in range(Paper.SAMLL_REPEAT):
-                        print(
-                            "Paper.figure_3: {} (#{}), {} (#{}), on portion {:.2f} (#{}) | iteration {}/{} ({:.2f}%)".format(
-                                metric_name, metric_index + 1, parameter, index + 1, portion, portion_index + 1, i + 1,
-                                Paper.SAMLL_REPEAT, 100 * (i + 1) / Paper.SAMLL_REPEAT))
-                        # create configuration for analysis
-                        sim = None
-                        if parameter == "iu_coverage":
-                            sim = SimulatorGenerator.sensitivity_random(iu_coverage=portion)
-                        elif parameter == "graph_density":
-                            sim = SimulatorGenerator.sensitivity_random(graph_density=portion)
-                        elif parameter == "population_density":
-                            sim = SimulatorGenerator.sensitivity_random(population_density=portion)
-                        elif parameter == "population_mobility":
-                            sim = SimulatorGenerator.sensitivity_random(population_density=portion)
-                        elif parameter == "iu_performance":
-                            sim = SimulatorGenerator.sensitivity_random(find_probability=portion)
-                        # Run simulator
-                        sim.run()
-                        # recall data
-                        if metric_name == "r_zero":
-                            metric.append(sim.mean_r_zero())
-                        elif metric_name == "max_infected":
-                            metric.append(sim.get_max_infected_portion())
-                    # compute this place in the heatmap
-                    parameter_mean_row.append(np.nanmean(metric, axis=0))
-                    parameter_std_row.append(np.nanstd(metric, axis=0))
+        metric_list = ["r_zero", "max_infected"]
+        # each cell adds replicates until it is precise enough, the cells run on a pool and are checkpointed
+        results = Paper.sweep(name="figure_3",
+                              grid=[{"metric_name": metric_list,
+                                     "parameter": [parameter],
+                                     "portion": cols[parameter]}
+                                    for parameter in parameter_list],
+                              unit_function=Paper.figure_3_cell).run()
+        for metric_name in metric_list:
+            for parameter in parameter_list:
+                rows = {value: Sweep.table(results=results,
+                                           index="parameter",
+                                           columns="portion",
+                                           value=value,
+                                           where={"metric_name": metric_name,
+                                                  "parameter": parameter}).loc[parameter].tolist()
+                        for value in ["mean", "std", "half_width", "repeats"]}
                 # save raw game
                 with open(os.path.join(Paper.PAPER_PLOTS_PATH, "sensitivity_{}_{}.json".format(metric_name, parameter)),
                           "w") as raw_file:
-                    json.dump({"mean": [val for val in parameter_mean_row], "std": [val for val in parameter_std_row]},
+                    json.dump(rows,
                               raw_file,
                               indent=2)
                 Plotter.sensitivity_line(x=cols[parameter],
-                                         mean=parameter_mean_row,
-                                         std=parameter_std_row,
+                                         mean=rows["mean"],
+                                         std=rows["std"],
                                          x_label="{}".format(parameter),
                                          y_label="{}".format(metric_name),
                                          save_path=os.path.join(Paper.PAPER_PLOTS_PATH,
@@ -123,17 +126,12 @@ class Paper:
     @staticmethod
     def figure_4():
         print("Working on Paper.figure_4")
-        epi_dists = []
-        for i in range(Paper.SAMLL_REPEAT):
-            print("Paper.figure_4: working on {}/{} ({:.2f}%)".format(i + 1, Paper.SAMLL_REPEAT,
-                                                                      100 * (i + 1) / Paper.SAMLL_REPEAT))
-            # generate settings for the simulator
-            sim = SimulatorGenerator.real_world(population_count=Paper.DEFAULT_POPULATION_SIZE,
-                                                max_time=30)
-            # Run simulator
-            sim.run()
-            # recall data
-            epi_dists.append(np.asarray(sim.epi_dist) / sim.population.get_size())
+        # generate settings for the simulators, run them and recall data
+        epi_dists = Paper.cached_replicates(sim_function=lambda: SimulatorGenerator.real_world(
+                                                population_count=Paper.DEFAULT_POPULATION_SIZE,
+                                                max_time=30),
+                                            first=0,
+                                            count=Paper.SAMLL_REPEAT)[0]
         Plotter.multi_basic_sim_plots(epi_dists=epi_dists,
                                       save_path=os.path.join(Paper.PAPER_PLOTS_PATH, "mean_seird.pdf"))
 
@@ -146,28 +144,17 @@ class Paper:
             for index, iu_coverage in enumerate(iu_coverages):
                 print("Paper.figure_5: working on IU {}/{} ({:.2f}%)".format(index + 1, len(iu_coverages),
                                                                              100 * (index + 1) / len(iu_coverages)))
-                epi_dists = []
-                for i in range(Paper.SAMLL_REPEAT):
-                    print("Paper.figure_5: inside IU #{}, working on {}/{} ({:.2f}%)".format(index + 1, i + 1,
-                                                                                             Paper.SAMLL_REPEAT, 100 * (
-                                                                                                         i + 1) / Paper.SAMLL_REPEAT))
-                    # generate settings for the simulator
-                    sim = SimulatorGenerator.real_world(population_count=Paper.DEFAULT_POPULATION_SIZE,
-                                                        max_time=30)
-                    # allocate CU to nodes
-                    if allocation_strategy == "random":
-                        sim.pip = PIPMultiAggressive(
-                            control_node_ids=random.sample(population=list(range(sim.graph.get_size())),
-                                                           k=round(sim.graph.get_size() * iu_coverage)),
-                            found_exposed=False)
-                    elif allocation_strategy == "optimal":
-                        OptimalInspectionUnitsAllocation.simple_brute_force(sim=sim,
-                                                                            iu_count=round(
-                                                                                sim.graph.get_size() * iu_coverage))
-                    # Run simulator
-                    sim.run()
-                    # recall data
-                    epi_dists.append(np.asarray(sim.epi_dist) / sim.population.get_size())
+                # the optimal allocation is searched once for all the replicates
+                allocation = Paper.optimal_allocation(iu_coverage=iu_coverage,
+                                                      workers=Paper.WORKERS) \
+                    if allocation_strategy == "optimal" else None
+                # generate settings for the simulators, run them and recall data
+                epi_dists = Paper.cached_replicates(
+                    sim_function=lambda: Paper.figure_5_sim(allocation_strategy=allocation_strategy,
+                                                            iu_coverage=iu_coverage,
+                                                            allocation=allocation),
+                    first=0,
+                    count=Paper.SAMLL_REPEAT)[0]
                 Plotter.multi_basic_sim_plots(epi_dists=epi_dists,
                                               save_path=os.path.join(Paper.PAPER_PLOTS_PATH,
                                                                      "mean_seird_with_iu_{}_percent_{}.pdf".format(
@@ -177,73 +164,249 @@ class Paper:
     @staticmethod
     def figure_6():
         print("Working on Paper.figure_6")
-        for metric_name in ["r_zero", "max_infected"]:
-            pip_list = ["iu_random", "iu_optimal", "sd", "masks"]
-            cols = [0.1 * i for i in range(11)]
-            data_mean = []
-            data_std = []
-            for index, pip in enumerate(pip_list):
-                pip_mean_row = []
-                pip_std_row = []
-                for portion_index, portion in enumerate(cols):
-                    metric = []
-                    for i in range(Paper.SAMLL_REPEAT):
-                        print("Paper.figure_6: "
-                              "working on pip = {} (#{}), on portion {:.1f} (#{}) "
-                              "with iteration {}/{} ({:.2f}%)".format(pip, index + 1,
-                                                                      portion, portion_index + 1,
-                                                                      i + 1, Paper.SAMLL_REPEAT,
-                                                                      100 * (i + 1) / Paper.SAMLL_REPEAT))
-                        # generate settings for the simulator
-                        sim = SimulatorGenerator.real_world(population_count=Paper.DEFAULT_POPULATION_SIZE,
-                                                            max_time=30)
-                        # allocate the right PIP to nodes
-                        if pip == "iu_random":
-                            sim.pip = PIPMultiAggressive(
-                                control_node_ids=random.sample(population=list(range(sim.graph.get_size())),
-                                                               k=round(sim.graph.get_size() * portion)),
-                                found_exposed=False)
-                        if pip == "iu_optimal":
-                            OptimalInspectionUnitsAllocation.greedy_brute_force(iu_count=len(sim.pip.control_node_ids),
-                                                                                sim=sim)
-                        elif pip == "sd":
-                            sim.walk_policy = WalkSocialDistance(obey_rate=portion)
-                        else:  # elif pip == "masks"
-                            [agent.put_mask() for agent in
-                             sim.population.agents[:round(portion) * sim.population.get_size()]]
-                        # Run simulator
-                        sim.run()
-                        # recall data
-                        if metric_name == "r_zero":
-                            metric.append(sim.mean_r_zero())
-                        elif metric_name == "max_infected":
-                            metric.append(sim.get_max_infected_portion())
-                    # compute this place in the heatmap
-                    pip_mean_row.append(np.nanmean(metric, axis=0))
-                    pip_std_row.append(np.nanstd(metric, axis=0))
-                # set all the row of this pip
-                data_mean.append(pip_mean_row)
-                data_std.append(pip_std_row)
-            # plot mean and std heatmaps
-            data_mean = pd.DataFrame(data=data_mean,
-                                     index=pip_list,
-                                     columns=["{:.1f}".format(0.1 * i) for i in range(11)])
-            data_mean.to_csv(os.path.join(Paper.PAPER_PLOTS_PATH, "pip_compare_mean_{}.csv".format(metric_name)))
-            Plotter.sensitivity_heatmap(data=data_mean,
-                                        x_label="Portion of the nodes/population that obey the PIP",
-                                        y_label="Pandemic intervention policy",
-                                        save_path=os.path.join(Paper.PAPER_PLOTS_PATH,
-                                                               "pip_compare_mean_{}.pdf".format(metric_name)))
+        metric_list = ["r_zero", "max_infected"]
+        pip_list = ["iu_random", "iu_optimal", "sd", "masks"]
+        cols = [0.1 * i for i in range(11)]
+        # each cell adds replicates until it is precise enough, the cells run on a pool and are checkpointed
+        results = Paper.sweep(name="figure_6",
+                              grid=[{"metric_name": metric_list,
+                                     "pip": pip_list,
+                                     "portion": cols}],
+                              unit_function=Paper.figure_6_cell).run()
+        for metric_name in metric_list:
+            tables = {}
+            for value in ["mean", "std", "half_width", "repeats"]:
+                tables[value] = Sweep.table(results=results,
+                                            index="pip",
+                                            columns="portion",
+                                            value=value,
+                                            where={"metric_name": metric_name})
+                tables[value].columns = ["{:.1f}".format(portion) for portion in cols]
+                tables[value].to_csv(os.path.join(Paper.PAPER_PLOTS_PATH,
+                                                  "pip_compare_{}_{}.csv".format(value, metric_name)))
             # plot mean and std heatmaps
-            data_std = pd.DataFrame(data=data_std,
-                                    index=pip_list,
-                                    columns=["{:.1f}".format(0.1 * i) for i in range(11)])
-            data_std.to_csv(os.path.join(Paper.PAPER_PLOTS_PATH, "pip_compare_std_{}.csv".format(metric_name)))
-            Plotter.sensitivity_heatmap(data=data_std,
-                                        x_label="Portion of the nodes/population that obey the PIP",
-                                        y_label="Pandemic intervention policy",
-                                        save_path=os.path.join(Paper.PAPER_PLOTS_PATH,
-                                                               "pip_compare_std_{}.pdf".format(metric_name)))
+            for value in ["mean", "std"]:
+                Plotter.sensitivity_heatmap(data=tables[value],
+                                            x_label="Portion of the nodes/population that obey the PIP",
+                                            y_label="Pandemic intervention policy",
+                                            save_path=os.path.join(Paper.PAPER_PLOTS_PATH,
+                                                                   "pip_compare_{}_{}.pdf".format(value, metric_name)))
+
+    @staticmethod
+    def figure_3_sim(parameter: str,
+                     portion: float) -> Simulator:
+        """
+        A single replicate of the sensitivity analysis, with the given parameter set to the given portion
+        """
+        sim = None
+        if parameter == "iu_coverage":
+            sim = SimulatorGenerator.sensitivity_random(iu_coverage=portion)
+        elif parameter == "graph_density":
+            sim = SimulatorGenerator.sensitivity_random(graph_density=portion)
+        elif parameter == "population_density":
+            sim = SimulatorGenerator.sensitivity_random(population_density=portion)
+        elif parameter == "population_mobility":
+            sim = SimulatorGenerator.sensitivity_random(population_density=portion)
+        elif parameter == "iu_performance":
+            sim = SimulatorGenerator.sensitivity_random(find_probability=portion)
+        return sim
+
+    @staticmethod
+    def figure_5_sim(allocation_strategy: str,
+                     iu_coverage: float,
+                     allocation: list = None) -> Simulator:
+        """
+        A single replicate of the real-world scenario with IUs allocated to the given portion of the nodes - at random,
+        or in the nodes of the given (optimal) allocation
+        """
+        # generate settings for the simulator
+        sim = SimulatorGenerator.real_world(population_count=Paper.DEFAULT_POPULATION_SIZE,
+                                            max_time=30)
+        # allocate CU to nodes
+        if allocation_strategy == "random":
+            sim.pip = PIPMultiAggressive(
+                control_node_ids=random.sample(population=list(range(sim.graph.get_size())),
+                                               k=round(sim.graph.get_size() * iu_coverage)),
+                found_exposed=False)
+        elif allocation_strategy == "optimal":
+            sim.allocate_iu(allocation=allocation)
+        return sim
+
+    @staticmethod
+    def figure_6_sim(pip: str,
+                     portion: float,
+                     allocation: list = None) -> Simulator:
+        """
+        A single replicate of the real-world scenario with the given PIP, obeyed by the given portion ("allocation" is
+        the optimal IU allocation of the portion, for "iu_optimal")
+        """
+        # generate settings for the simulator
+        sim = SimulatorGenerator.real_world(population_count=Paper.DEFAULT_POPULATION_SIZE,
+                                            max_time=30)
+        # allocate the right PIP to nodes
+        if pip == "iu_random":
+            sim.pip = PIPMultiAggressive(
+                control_node_ids=random.sample(population=list(range(sim.graph.get_size())),
+                                               k=round(sim.graph.get_size() * portion)),
+                found_exposed=False)
+        elif pip == "iu_optimal":
+            sim.allocate_iu(allocation=allocation)
+        elif pip == "sd":
+            sim.walk_policy = WalkSocialDistance(obey_rate=portion)
+        else:  # elif pip == "masks"
+            [agent.put_mask() for agent in
+             sim.population.agents[:round(portion) * sim.population.get_size()]]
+        return sim
+
+    @staticmethod
+    def figure_3_cell(metric_name: str,
+                      parameter: str,
+                      portion: float) -> dict:
+        """
+        A cell of the sensitivity analysis, sampled until it is precise enough
+        """
+        return Paper.adaptive_runner(metric_name=metric_name).run(
+            sample_function=lambda first, count: Paper.cell_metric(
+                sim_function=lambda: Paper.figure_3_sim(parameter=parameter, portion=portion),
+                first=first,
+                count=count,
+                metric_name=metric_name))
+
+    @staticmethod
+    def figure_6_cell(metric_name: str,
+                      pip: str,
+                      portion: float) -> dict:
+        """
+        A cell of the PIP comparison, sampled until it is precise enough.
+        It runs inside a unit of the figure's sweep, which is already on a pool, so the IU search is serial.
+        """
+        allocation = Paper.optimal_allocation(iu_coverage=portion,
+                                              greedy=True) if pip == "iu_optimal" else None
+        return Paper.adaptive_runner(metric_name=metric_name).run(
+            sample_function=lambda first, count: Paper.cell_metric(
+                sim_function=lambda: Paper.figure_6_sim(pip=pip, portion=portion, allocation=allocation),
+                first=first,
+                count=count,
+                metric_name=metric_name))
+
+    @staticmethod
+    def optimal_allocation(iu_coverage: float,
+                           greedy: bool = False,
+                           workers: int = 1) -> list:
+        """
+        The IU allocation of the given portion of the real-world graph's nodes with the lowest R0 (by the brute-force
+        or the greedy search), searched once on a replicate seeded from SEED and then used by all the replicates
+        """
+        MultiSim.seed_all(seed=Paper.SEED)
+        sim = SimulatorGenerator.real_world(population_count=Paper.DEFAULT_POPULATION_SIZE,
+                                            max_time=30)
+        search = OptimalInspectionUnitsAllocation.greedy_brute_force if greedy \
+            else OptimalInspectionUnitsAllocation.simple_brute_force
+        return list(search(sim=sim,
+                           iu_count=round(sim.graph.get_size() * iu_coverage),
+                           workers=workers))
+
+    @staticmethod
+    def sweep(name: str,
+              grid: list,
+              unit_function) -> Sweep:
+        """
+        A sweep of the figure's cells, checkpointed next to the figure - the checkpoint is used only by runs with the
+        same seed, sampling settings and SEIRD parameters
+        """
+        return Sweep(name=name,
+                     grid=grid,
+                     unit_function=unit_function,
+                     checkpoint_path=os.path.join(Paper.PAPER_PLOTS_PATH, "{}_sweep.jsonl".format(name)),
+                     workers=Paper.WORKERS,
+                     version=ResultCache.key(description={"seed": Paper.SEED,
+                                                          "min_repeat": Paper.ADAPTIVE_MIN_REPEAT,
+                                                          "max_repeat": Paper.SAMLL_REPEAT,
+                                                          "batch_size": Paper.ADAPTIVE_BATCH_SIZE,
+                                                          "half_width": Paper.CI_HALF_WIDTH,
+                                                          "relative_half_width": Paper.CI_RELATIVE_HALF_WIDTH}))
+
+    @staticmethod
+    def adaptive_runner(metric_name: str) -> AdaptiveRunner:
+        """
+        The sequential sampling of a cell of the given metric, capped at "SAMLL_REPEAT" replicates
+        """
+        return AdaptiveRunner(target_half_width=Paper.CI_HALF_WIDTH[metric_name],
+                              relative_half_width=Paper.CI_RELATIVE_HALF_WIDTH,
+                              min_repeat=Paper.ADAPTIVE_MIN_REPEAT,
+                              max_repeat=Paper.SAMLL_REPEAT,
+                              batch_size=Paper.ADAPTIVE_BATCH_SIZE)
+
+    @staticmethod
+    def cell_metric(sim_function,
+                    first: int,
+                    count: int,
+                    metric_name: str) -> list:
+        """
+        The wanted metric of replicates first, ..., first + count - 1 of a cell
+        """
+        _, r_zeros, max_infected_portions = Paper.cached_replicates(sim_function=sim_function,
+                                                                    first=first,
+                                                                    count=count)
+        return list(r_zeros if metric_name == "r_zero" else max_infected_portions)
+
+    @staticmethod
+    def cached_replicates(sim_function,
+                          first: int,
+                          count: int):
+        """
+        The outcome (as in "run_replicates") of replicates first, ..., first + count - 1 of the scenario that
+        "sim_function()" generates a single replicate of.
+        The scenario is described by a replicate generated from SEED (see "ResultCache.describe"), and the replicates
+        are seeded by the key of the scenario, so they are the same on every invocation and are read from the cache
+        when they were already computed.
+        """
+        MultiSim.seed_all(seed=Paper.SEED)
+        key = ResultCache.key(description={"scenario": ResultCache.describe(sim=sim_function()),
+                                           "seed": Paper.SEED,
+                                           "first": first,
+                                           "count": count})
+        cache = Paper.result_cache()
+        if cache is not None:
+            cached = cache.get(key=key)
+            if cached is not None:
+                return cached["epi_dists"], cached["r_zeros"], cached["max_infected"]
+        MultiSim.seed_all(seed=ResultCache.seed(key=key))
+        epi_dists, r_zeros, max_infected = Paper.run_replicates(sims=[sim_function() for _ in range(count)])
+        if cache is not None:
+            cache.put(key=key,
+                      epi_dists=epi_dists,
+                      r_zeros=r_zeros,
+                      max_infected=max_infected)
+        return epi_dists, r_zeros, max_infected
+
+    @staticmethod
+    def result_cache():
+        """
+        The on-disk cache of the replicates' outcomes (None if not used)
+        """
+        if Paper.USE_CACHE and Paper._cache is None:
+            Paper._cache = ResultCache(folder=Paper.CACHE_PATH,
+                                       max_bytes=Paper.CACHE_MAX_BYTES)
+        return Paper._cache if Paper.USE_CACHE else None
+
+    @staticmethod
+    def run_replicates(sims: list):
+        """
+        Run the replicates of a single cell - together as an ensemble if they are replicates of a supported scenario,
+        otherwise one after the other. Returns the (replicates x steps x states) epidemiological distribution as
+        portions of the population, the mean R0 and the max infected portion of each replicate
+        """
+        if EnsembleSimulator.supports(sims=sims):
+            ensemble = EnsembleSimulator.from_simulators(sims=sims)
+            ensemble.run()
+            return ensemble.epi_dist / ensemble.get_population_size(), \
+                   ensemble.mean_r_zero(), \
+                   ensemble.get_max_infected_portion()
+        [sim.run() for sim in sims]
+        return np.stack([sim.epi_dist / sim.population.get_size() for sim in sims]), \
+               np.array([sim.mean_r_zero() for sim in sims]), \
+               np.array([sim.get_max_infected_portion() for sim in sims])
 
     @staticmethod
     def appendix():
@@ -0,0 +1,107 @@
+# library imports
+import numpy as np
+
+# project imports
+from graph import Graph
+from pips.pip import PIP
+from population import Population
+from columnar_population import ColumnarPopulation
+from epidemiological_state import EpidemiologicalState
+
+
+class PIPControlMask(PIP):
+    """
+    A PIP operation with inspection units (IUs) in a set of controlled nodes that take out the infected agents they
+    find, held as a boolean mask of the nodes so checking an agent costs the same for any number of controlled nodes.
+    In each step the candidates (I agents, and E agents if "found_exposed", in controlled nodes) are found with one
+    vectorized Bernoulli draw, and all the agents outside the graph that are no longer E or I are released together to
+    uniformly random nodes. Both draws have a number for every agent (by its index), so the same random stream treats
+    the same agent the same way whatever the other agents do.
+    """
+
+    def __init__(self,
+                 control_node_ids: list,
+                 find_probability: float = 0.95,
+                 found_exposed: bool = False):
+        PIP.__init__(self)
+        self.control_node_ids = control_node_ids
+        self.found_exposed = found_exposed
+        self.find_probability = find_probability
+
+    @property
+    def control_node_ids(self):
+        return self._control_node_ids
+
+    @control_node_ids.setter
+    def control_node_ids(self,
+                         control_node_ids: list):
+        # the mask is built again on the next step, so set the ids again after changing them in place
+        self._control_node_ids = control_node_ids
+        self._control_mask = None
+
+    def get_control_mask(self,
+                         node_count: int) -> np.ndarray:
+        """
+        The controlled nodes of a graph with "node_count" nodes, as a mask of node_count + 1 entries (the outside of the
+        graph last, never controlled)
+        """
+        if self._control_mask is None or len(self._control_mask) != node_count + 1:
+            control_node_ids = np.asarray(list(self._control_node_ids), dtype=np.int64)
+            self._control_mask = np.zeros(node_count + 1, dtype=bool)
+            self._control_mask[control_node_ids[(control_node_ids >= 0) & (control_node_ids < node_count)]] = True
+        return self._control_mask
+
+    def run(self,
+            graph: Graph,
+            population: Population) -> Population:
+        """
+        All infected in the controlled nodes are taken away (with the find probability)
+        """
+        outside_node_id = graph.get_size()
+        if isinstance(population, ColumnarPopulation):
+            found, released, release_locations = self.detect(locations=population.locations,
+                                                             e_states=population.e_states,
+                                                             outside_node_id=outside_node_id)
+            population.set_location(indices=found,
+                                    new_locations=outside_node_id)
+            population.set_location(indices=released,
+                                    new_locations=release_locations)
+            return population
+        agents = population.agents
+        found, released, release_locations = self.detect(locations=np.fromiter((agent.location for agent in agents),
+                                                                               dtype=np.int64,
+                                                                               count=len(agents)),
+                                                         e_states=np.fromiter((int(agent.e_state) for agent in agents),
+                                                                              dtype=np.int8,
+                                                                              count=len(agents)),
+                                                         outside_node_id=outside_node_id)
+        for index in found.tolist():
+            agents[index].location = outside_node_id
+        for index, new_location in zip(released.tolist(), release_locations.tolist()):
+            agents[index].location = new_location
+        return population
+
+    def detect(self,
+               locations: np.ndarray,
+               e_states: np.ndarray,
+               outside_node_id: int):
+        """
+        The indexes of the agents found by the IUs, the indexes of the agents to release from the outside of the graph
+        and the nodes they are released to
+        """
+        uniforms = np.random.random(len(locations))
+        destinations = np.random.randint(0, outside_node_id, size=len(locations))
+        is_i = e_states == EpidemiologicalState.I
+        is_e = e_states == EpidemiologicalState.E
+        candidates = np.flatnonzero(self.get_control_mask(node_count=outside_node_id)[locations]
+                                    & (is_i | (is_e & self.found_exposed)))
+        found = candidates[uniforms[candidates] < self.find_probability]
+        released = np.flatnonzero((locations == outside_node_id) & ~is_i & ~is_e)
+        return found, released, destinations[released]
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __str__(self):
+        return "<{}: {} nodes>".format(type(self).__name__,
+                                       len(self._control_node_ids))
@@ -144,8 +144,8 @@ class Plotter:
         """
         Plot distribution over time of the epidemiological states
         """
-        data = np.asarray(sim.epi_dist)
-        for epi_state in range(len(data[0])):
+        data = sim.epi_dist
+        for epi_state in range(data.shape[1]):
             plt.plot(range(len(data)),
                      data[:, epi_state] / sim.population.get_size(),
                      Plotter.STYLES[epi_state],
@@ -167,10 +167,11 @@ class Plotter:
         plt.close()
 
     @staticmethod
-    def multi_basic_sim_plots(epi_dists: list,
+    def multi_basic_sim_plots(epi_dists: np.ndarray,
                               save_path: str):
         """
-        Plot distribution over time of the epidemiological states for a number of simulations
+        Plot distribution over time of the epidemiological states for a number of simulations, given as a
+        (simulations x steps x states) array
         """
         data_array = np.asarray(epi_dists)
         mean_data = np.nanmean(data_array, axis=0)
@@ -24,6 +24,26 @@ class Population:
                    node_id: int):
         return len([True for agent in self.agents if agent.location == node_id])
 
+    def count_states(self):
+        counters = [0 for _ in range(len(EpidemiologicalState))]
+        for agent in self.agents:
+            counters[int(agent.e_state)] += 1
+        return counters
+
+    def count_locations(self,
+                        node_count: int):
+        counters = [0 for _ in range(node_count)]
+        for agent in self.agents:
+            counters[int(agent.location)] += 1
+        return counters
+
+    def count_node_states(self,
+                          node_count: int):
+        counters = [[0 for _ in range(len(EpidemiologicalState))] for _ in range(node_count)]
+        for agent in self.agents:
+            counters[int(agent.location)][int(agent.e_state)] += 1
+        return counters
+
     # end - smart getters #
 
     # smart setters #
@@ -0,0 +1,60 @@
+# library imports
+import random
+import numpy as np
+from contextlib import contextmanager
+
+# project imports
+
+
+class RandomStreams:
+    """
+    Separate seeded random streams for each random phase of a simulation step (walk, SEIRD and PIP).
+    A phase swaps its stream into the global "random" and "np.random" generators while it runs and swaps the outer state
+    back afterwards, so simulations given the same seed draw the same numbers in each phase - the common random numbers
+    that make runs of different settings (e.g., IU allocations) differ by the settings and not by noise.
+    For the numbers to stay paired once the runs diverge, each phase of a columnar population draws a fixed number of
+    values per agent in every step and indexes them by the agent, never as many values as there are due or found agents.
+    """
+
+    # CONSTS #
+    PHASES = ("walk", "seird", "pip")
+    # END - CONSTS #
+
+    def __init__(self,
+                 seed: int = None):
+        self.states = {}
+        for phase, phase_seed in zip(RandomStreams.PHASES,
+                                     np.random.SeedSequence(seed).spawn(len(RandomStreams.PHASES))):
+            words = phase_seed.generate_state(4)
+            self.states[phase] = (random.Random(int.from_bytes(words.tobytes(), "little")).getstate(),
+                                  np.random.RandomState(words).get_state())
+
+    @contextmanager
+    def phase(self,
+              name: str):
+        """
+        Run the block with the stream of the given phase as the global random state
+        """
+        outer_states = (random.getstate(), np.random.get_state())
+        random.setstate(self.states[name][0])
+        np.random.set_state(self.states[name][1])
+        try:
+            yield
+        finally:
+            self.states[name] = (random.getstate(), np.random.get_state())
+            random.setstate(outer_states[0])
+            np.random.set_state(outer_states[1])
+
+    def copy(self):
+        """
+        A copy that continues from the same point of each stream (the saved states are never changed in place)
+        """
+        answer = RandomStreams.__new__(RandomStreams)
+        answer.states = dict(self.states)
+        return answer
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __str__(self):
+        return "<RandomStreams: {}>".format(", ".join(RandomStreams.PHASES))
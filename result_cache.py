@@ -0,0 +1,199 @@
+# library imports
+import os
+import json
+import hashlib
+import numpy as np
+
+# project imports
+from seird_parms import SEIRDparameter
+from columnar_population import ColumnarPopulation
+
+
+class ResultCache:
+    """
+    An on-disk cache of simulation outcomes (arrays saved as .npz files), keyed by a stable hash of the description
+    of the scenario together with the SEIRD parameters, so a change of the model parameters never reads old results.
+    The description of a generated simulator ("describe") covers its graph, walk, PIP, max time and population, so a
+    change of a generator changes the keys by itself.
+    The least recently used files are removed once the cache is larger than its size bound.
+    """
+
+    # CONSTS #
+
+    # change it when the logic of the simulation step changes, so the results computed before are not used
+    RESULTS_VERSION = 4
+    FILE_EXTENSION = ".npz"
+    # the files being written (by any process) end with this, so they are never taken for results
+    TEMP_EXTENSION = ".tmp"
+    # the folder is scanned again after this many writes of this process even if it seems within its bound, to count
+    # the files written by other processes
+    SCAN_EVERY_PUTS = 100
+
+    # END - CONSTS #
+
+    def __init__(self,
+                 folder: str,
+                 max_bytes: int = 1024 ** 3):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        os.makedirs(folder, exist_ok=True)
+        # the size of the folder at the last scan plus what this process wrote since (None before the first scan)
+        self._size = None
+        self._puts_since_scan = 0
+
+    # logic #
+
+    def get(self,
+            key: str):
+        """
+        The arrays stored under the key (as a dict), or None if they are not in the cache
+        """
+        path = self._path(key=key)
+        try:
+            with np.load(path) as data:
+                answer = {name: data[name] for name in data.files}
+        except (OSError, ValueError):
+            return None
+        # mark as recently used (unless another process evicted it meanwhile)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return answer
+
+    def put(self,
+            key: str,
+            **arrays):
+        """
+        Store the given arrays under the key, and remove old results if the cache is too large
+        """
+        path = self._path(key=key)
+        temp_path = "{}.{}{}".format(path, os.getpid(), ResultCache.TEMP_EXTENSION)
+        # written through a file object, so NumPy does not add ".npz" to the temporary name
+        with open(temp_path, "wb") as temp_file:
+            np.savez(temp_file, **arrays)
+        size = os.path.getsize(temp_path)
+        os.replace(temp_path, path)
+        self._puts_since_scan += 1
+        if self._size is not None:
+            self._size += size
+        if self._size is None or self._size > self.max_bytes \
+                or self._puts_since_scan >= ResultCache.SCAN_EVERY_PUTS:
+            self.evict()
+
+    def evict(self):
+        """
+        Remove the least recently used results until the cache is within its size bound - files of other processes
+        that are still being written are left alone, and files that are gone meanwhile are skipped
+        """
+        files = []
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                if not entry.name.endswith(ResultCache.FILE_EXTENSION):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        total_size = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total_size <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total_size -= size
+        self._size = total_size
+        self._puts_since_scan = 0
+
+    def clear(self):
+        for name in os.listdir(self.folder):
+            if name.endswith(ResultCache.FILE_EXTENSION):
+                try:
+                    os.remove(os.path.join(self.folder, name))
+                except OSError:
+                    pass
+        self._size = 0
+
+    def _path(self,
+              key: str) -> str:
+        return os.path.join(self.folder, key + ResultCache.FILE_EXTENSION)
+
+    # end - logic #
+
+    @staticmethod
+    def key(description: dict) -> str:
+        """
+        A stable hash of the scenario's description (generator parameters, walk, PIP, max time, seed, ...), the SEIRD
+        parameters and the results version
+        """
+        content = {"description": description,
+                   "seird": ResultCache.seird_parameters(),
+                   "version": ResultCache.RESULTS_VERSION}
+        return hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def describe(sim) -> dict:
+        """
+        The description of a generated simulator, for the keys - a digest of its graph's CSR arrays, the types and
+        settings of its walk and PIP, its max time, and the size and a digest of its (initial) population
+        """
+        offsets, targets, weights = sim.graph.get_csr()
+        population = sim.population if isinstance(sim.population, ColumnarPopulation) \
+            else ColumnarPopulation.from_population(population=sim.population)
+        return {"graph": ResultCache.array_digest(arrays=[np.asarray(offsets, dtype=np.int64),
+                                                          np.asarray(targets, dtype=np.int64),
+                                                          np.asarray(weights, dtype=np.float64)]),
+                "node_count": sim.graph.get_size(),
+                "walk": ResultCache.settings(policy=sim.walk_policy),
+                "pip": ResultCache.settings(policy=sim.pip),
+                "max_time": sim.max_time,
+                "population_count": population.get_size(),
+                "population": ResultCache.array_digest(arrays=[population.e_states,
+                                                               population.locations,
+                                                               population.timers,
+                                                               population.masks])}
+
+    @staticmethod
+    def settings(policy) -> dict:
+        """
+        The type of a walk or PIP and its settings - its attributes that are numbers, strings or lists of them (the
+        cached tables and masks are left out)
+        """
+        return {"type": type(policy).__name__,
+                "settings": {name.lstrip("_"): value for name, value in sorted(vars(policy).items())
+                             if ResultCache._is_setting(value=value)}}
+
+    @staticmethod
+    def array_digest(arrays: list) -> str:
+        digest = hashlib.sha256()
+        for array in arrays:
+            array = np.ascontiguousarray(array)
+            digest.update("{}{}".format(array.dtype.str, array.shape).encode("utf-8"))
+            digest.update(array.tobytes())
+        return digest.hexdigest()
+
+    @staticmethod
+    def _is_setting(value) -> bool:
+        if isinstance(value, (list, tuple)):
+            return all(ResultCache._is_setting(value=item) for item in value)
+        return isinstance(value, (bool, int, float, str, np.integer, np.floating))
+
+    @staticmethod
+    def seed(key: str) -> int:
+        """
+        A 32-bit seed derived from the key, so the results of a key can be computed again
+        """
+        return int(key[:8], 16)
+
+    @staticmethod
+    def seird_parameters() -> dict:
+        return {name: value for name, value in vars(SEIRDparameter).items() if not name.startswith("_")}
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __str__(self):
+        return "<ResultCache: {}>".format(self.folder)
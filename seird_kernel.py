@@ -0,0 +1,109 @@
+# library imports
+import numpy as np
+
+# project imports
+from jit_kernels import JitKernels
+from seird_parms import SEIRDparameter
+from transition_calendar import TransitionCalendar
+from columnar_population import ColumnarPopulation
+from epidemiological_state import EpidemiologicalState
+
+
+class SEIRDkernel:
+    """
+    The SEIRD step of all the nodes at once on a columnar population - the per-node counts are segmented reductions
+    (bincount over the agents' locations) and the transitions are array operations, so the cost grows with the
+    number of nodes and not with Python-level iteration over the agents
+    """
+
+    def __init__(self):
+        pass
+
+    @staticmethod
+    def run(population: ColumnarPopulation,
+            node_count: int):
+        """
+        Run a single SEIRD step on all the agents, where node "node_count" is the outside of the graph (no infection)
+        """
+        infect_counts = SEIRDkernel.infect_counts(population=population,
+                                                  node_count=node_count)
+        newly_exposed = SEIRDkernel.first_susceptibles(e_states=population.e_states,
+                                                       locations=population.locations,
+                                                       infect_counts=infect_counts)
+        if population.calendar is None:
+            population.attach_calendar(calendar=TransitionCalendar())
+        # clock tic
+        population.tic()
+        SEIRDkernel.timed_transitions(population=population)
+        population.set_e_state(indices=newly_exposed,
+                               new_e_state=EpidemiologicalState.E)
+
+    @staticmethod
+    def infect_counts(population: ColumnarPopulation,
+                      node_count: int) -> np.ndarray:
+        """
+        The number of susceptible agents that get infected in each node (the outside node included, with zero)
+        """
+        bins = node_count + 1
+        is_s = population.e_states == EpidemiologicalState.S
+        is_i = population.e_states == EpidemiologicalState.I
+        s_count = np.bincount(population.locations[is_s], minlength=bins)[:bins]
+        i_count = np.bincount(population.locations[is_i], minlength=bins)[:bins]
+        s_mask = np.bincount(population.locations[is_s & population.masks], minlength=bins)[:bins]
+        i_mask = np.bincount(population.locations[is_i & population.masks], minlength=bins)[:bins]
+        infect_counts = np.ceil(SEIRDparameter.beta * s_count * i_count)
+        # reduce infection count due to masks
+        s_mask_rate = np.divide(s_mask, s_count, out=np.zeros(bins), where=s_count > 0) * SEIRDparameter.s_mask_reduction
+        i_mask_rate = np.divide(i_mask, i_count, out=np.zeros(bins), where=i_count > 0) * SEIRDparameter.i_mask_reduction
+        infect_counts *= (1 - s_mask_rate)
+        infect_counts *= (1 - i_mask_rate)
+        infect_counts = np.round(infect_counts).astype(np.int64)
+        # no infection outside the graph
+        infect_counts[node_count:] = 0
+        return infect_counts
+
+    @staticmethod
+    def first_susceptibles(e_states: np.ndarray,
+                           locations: np.ndarray,
+                           infect_counts: np.ndarray) -> np.ndarray:
+        """
+        The indexes of the first "infect_counts[node]" susceptible agents (by their order in the population) of each node
+        """
+        if JitKernels.ENABLED:
+            return JitKernels.first_susceptibles(e_states=e_states,
+                                                 locations=locations,
+                                                 infect_counts=infect_counts,
+                                                 s_state=int(EpidemiologicalState.S))
+        candidates = np.flatnonzero(e_states == EpidemiologicalState.S)
+        candidates = candidates[infect_counts[locations[candidates]] > 0]
+        candidates = candidates[np.argsort(locations[candidates], kind="stable")]
+        candidate_locations = locations[candidates]
+        node_ids, starts, counts = np.unique(candidate_locations, return_index=True, return_counts=True)
+        ranks = np.arange(len(candidates)) - np.repeat(starts, counts)
+        return candidates[ranks < infect_counts[candidate_locations]]
+
+    @staticmethod
+    def timed_transitions(population: ColumnarPopulation):
+        """
+        The E->I and I->R/D transitions of the agents that are in E or I long enough, taken from the population's
+        transition calendar (which "run" attaches before the first tic). The R/D draw has a number for every agent (by
+        its index), so the same random stream gives each agent the same outcome whichever agents are due.
+        """
+        # both are taken before any transition, so an agent that just became I is not checked for I->R/D
+        to_i = population.calendar.pop_due(population=population,
+                                           e_state=EpidemiologicalState.E)
+        to_r_or_d = population.calendar.pop_due(population=population,
+                                                e_state=EpidemiologicalState.I)
+        is_dead = np.random.random(population.get_size())[to_r_or_d] < SEIRDparameter.psi
+        population.set_e_state(indices=to_i,
+                               new_e_state=EpidemiologicalState.I)
+        population.set_e_state(indices=to_r_or_d[is_dead],
+                               new_e_state=EpidemiologicalState.D)
+        population.set_e_state(indices=to_r_or_d[~is_dead],
+                               new_e_state=EpidemiologicalState.R)
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __str__(self):
+        return "<SEIRDkernel>"
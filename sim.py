@@ -1,7 +1,9 @@
 # library imports
+import os
 import math
 import random
 import numpy as np
+from contextlib import nullcontext
 
 # project imports
 from graph import Graph
@@ -9,7 +11,11 @@ from pips.multi_aggressive_pip import PIPMultiAggressive
 from pips.pip import PIP
 from walks.walk import Walk
 from population import Population
+from columnar_population import ColumnarPopulation
+from seird_kernel import SEIRDkernel
 from seird_parms import SEIRDparameter
+from random_streams import RandomStreams
+from step_profiler import StepProfiler
 from epidemiological_state import EpidemiologicalState
 
 
@@ -18,17 +24,34 @@ class Simulator:
     The main class of the project - the simulator
     """
 
+    # CONSTS #
+
+    # the same scenario can give different results, so it is repeated to reduce stochastic noise
+    DETERMINISTIC = False
+
+    # the type of the recorded number of agents in each state
+    EPI_DIST_TYPE = np.int64
+    NODE_DIST_TYPE = np.int32
+
+    # END - CONSTS #
+
     def __init__(self,
                  population: Population,
                  graph: Graph,
                  walk_policy: Walk,
                  pip: PIP,
-                 max_time: int):
+                 max_time: int,
+                 random_streams: RandomStreams = None,
+                 profiler: StepProfiler = None):
         # sim settings
         self.population = population
         self.graph = graph
         self.walk_policy = walk_policy
         self.pip = pip
+        # if set, each phase of the step draws from its own seeded stream (common random numbers)
+        self.random_streams = random_streams
+        # if set, the time of each phase of a step and what it did are recorded (see "StepProfiler")
+        self.profiler = profiler
 
         # technical
         self.max_time = max_time
@@ -36,16 +59,48 @@ class Simulator:
         # operation
         self.step = 0
 
-        # later analysis
-        self.epi_dist = []
+        # later analysis - a (steps x states) record, and optionally a (steps x nodes x states) one
+        self._epi_dist = np.zeros((max_time + 1, len(EpidemiologicalState)), dtype=self.EPI_DIST_TYPE)
+        self._node_dist = None
+        # the memory-mapped file of the per-node record, if there is one
+        self._node_dist_path = None
+
+    @property
+    def epi_dist(self) -> np.ndarray:
+        """
+        The number of agents in each epidemiological state at each step done so far (a view of the record)
+        """
+        return self._epi_dist[:self.step]
+
+    @property
+    def node_dist(self) -> np.ndarray:
+        """
+        The number of agents in each epidemiological state in each node (the outside node last) at each step done since
+        "record_node_dist" was called (None if it was not)
+        """
+        return self._node_dist[:self.step] if self._node_dist is not None else None
+
+    def record_node_dist(self,
+                         path: str = None):
+        """
+        Record the per-node distribution as well - in memory, or in a memory-mapped .npy file at "path" for long or
+        large runs (the file itself grows if the run goes beyond "max_time")
+        """
+        shape = (len(self._epi_dist), self.graph.get_size() + 1, len(EpidemiologicalState))
+        self._node_dist_path = path
+        if path is None:
+            self._node_dist = np.zeros(shape, dtype=self.NODE_DIST_TYPE)
+        else:
+            self._node_dist = np.lib.format.open_memmap(path, mode="w+", dtype=self.NODE_DIST_TYPE, shape=shape)
 
     # logic #
 
     def run(self):
         while self.step <= self.max_time:
             # edge case
-            if self.step > 0 and self.epi_dist[-1][int(EpidemiologicalState.I)] == 0:
-                self.epi_dist.append(self.epi_dist[-1].copy())
+            if self.step > 0 and self._epi_dist[self.step - 1, int(EpidemiologicalState.I)] == 0:
+                self.record_step(epi_state=self._epi_dist[self.step - 1],
+                                 node_state=self._node_dist[self.step - 1] if self._node_dist is not None else None)
                 self.step += 1
             else:
                 self.run_step()
@@ -54,22 +109,142 @@ class Simulator:
         """
         The main logic of the class, make a single step in time
         """
-        # split the population for nodes and run the epidemiological model
-        agents_in_nodes = [[] for _ in range(self.graph.get_size()+1)]
-        [agents_in_nodes[agent.location].append(agent) for agent in self.population.agents]
-        # run SEIRD for each node
-        [self.seird(node_pop=node_pop) if node_index < self.graph.get_size() else self.outside_seird(node_pop=node_pop)
-         for node_index, node_pop in enumerate(agents_in_nodes)]
+        if self.profiler is not None:
+            self._profiled_step()
+            return
+        # run the epidemiological model
+        self.seird_step()
         # walk the population
-        self.population = self.walk_policy.run(population=self.population,
-                                               graph=self.graph)
+        self.walk_step()
         # PIP the population
-        self.population = self.pip.run(population=self.population, graph=self.graph)
+        self.pip_step()
         # recall state for later
-        self.epi_dist.append(self.gather_epi_state())
+        self.record_step(epi_state=self.gather_epi_state(),
+                         node_state=self.gather_node_state() if self._node_dist is not None else None)
         # count this step
         self.step += 1
 
+    def _profiled_step(self):
+        """
+        The same step as "run_step", with each phase timed by the profiler and its counters taken between the phases
+        """
+        self.profiler.start_step(step=self.step)
+        s_before = self.gather_epi_state()[int(EpidemiologicalState.S)]
+        with self.profiler.phase(name="seird"):
+            self.seird_step()
+        epi_state = self.gather_epi_state()
+        self.profiler.count(name="infections",
+                            value=s_before - epi_state[int(EpidemiologicalState.S)])
+        locations = self._locations()
+        with self.profiler.phase(name="walk"):
+            self.walk_step()
+        walked_locations = self._locations()
+        with self.profiler.phase(name="pip"):
+            self.pip_step()
+        pip_locations = self._locations()
+        if locations is not None:
+            outside_node_id = self.graph.get_size()
+            self.profiler.count(name="moved",
+                                value=int(np.count_nonzero(locations != walked_locations)))
+            self.profiler.count(name="isolated",
+                                value=int(np.count_nonzero((pip_locations == outside_node_id)
+                                                           & (walked_locations != outside_node_id))))
+        with self.profiler.phase(name="gather"):
+            self.record_step(epi_state=self.gather_epi_state(),
+                             node_state=self.gather_node_state() if self._node_dist is not None else None)
+        self.step += 1
+
+    def _locations(self):
+        """
+        A copy of the agents' locations, for the profiler's counters
+        """
+        if isinstance(self.population, ColumnarPopulation):
+            return self.population.locations.copy()
+        return np.array([agent.location for agent in self.population.agents], dtype=np.int64)
+
+    def _profile(self,
+                 phase: str):
+        """
+        The profiler's timer of the given phase, or nothing if the simulator is not profiled
+        """
+        return self.profiler.phase(name=phase) if self.profiler is not None else nullcontext()
+
+    def seird_step(self):
+        """
+        The SEIRD phase of the step - all the nodes at once for a columnar population, otherwise node after node
+        """
+        with self._stream(phase="seird"):
+            if isinstance(self.population, ColumnarPopulation):
+                SEIRDkernel.run(population=self.population,
+                                node_count=self.graph.get_size())
+            else:
+                # split the population for nodes
+                with self._profile(phase="partition"):
+                    agents_in_nodes = [[] for _ in range(self.graph.get_size()+1)]
+                    [agents_in_nodes[agent.location].append(agent) for agent in self.population.agents]
+                # run SEIRD for each node
+                [self.seird(node_pop=node_pop) if node_index < self.graph.get_size() else self.outside_seird(node_pop=node_pop)
+                 for node_index, node_pop in enumerate(agents_in_nodes)]
+
+    def walk_step(self):
+        """
+        The walk phase of the step
+        """
+        with self._stream(phase="walk"):
+            self.population = self.walk_policy.run(population=self.population,
+                                                   graph=self.graph)
+
+    def pip_step(self):
+        """
+        The PIP phase of the step
+        """
+        with self._stream(phase="pip"):
+            self.population = self.pip.run(population=self.population, graph=self.graph)
+
+    def record_step(self,
+                    epi_state,
+                    node_state=None):
+        """
+        Write the state of the current step into the records, which grow if the run goes beyond "max_time"
+        """
+        if self.step >= len(self._epi_dist):
+            self._epi_dist = np.concatenate((self._epi_dist, np.zeros_like(self._epi_dist)))
+            if self._node_dist is not None:
+                self._grow_node_dist(length=len(self._epi_dist))
+        self._epi_dist[self.step] = epi_state
+        if node_state is not None:
+            self._node_dist[self.step] = node_state
+
+    def _grow_node_dist(self,
+                        length: int):
+        """
+        Make room for "length" steps in the per-node record - a memory-mapped record stays in its file, which is written
+        again with the larger shape
+        """
+        if self._node_dist_path is None:
+            self._node_dist = np.concatenate((self._node_dist,
+                                              np.zeros((length - len(self._node_dist),) + self._node_dist.shape[1:],
+                                                       dtype=self._node_dist.dtype)))
+            return
+        temp_path = self._node_dist_path + ".grow.tmp"
+        grown = np.lib.format.open_memmap(temp_path,
+                                          mode="w+",
+                                          dtype=self._node_dist.dtype,
+                                          shape=(length,) + self._node_dist.shape[1:])
+        grown[:len(self._node_dist)] = self._node_dist
+        grown.flush()
+        del grown
+        self._node_dist = None
+        os.replace(temp_path, self._node_dist_path)
+        self._node_dist = np.lib.format.open_memmap(self._node_dist_path, mode="r+")
+
+    def _stream(self,
+                phase: str):
+        """
+        The random stream of the given phase, or the global random state if the simulator has no streams
+        """
+        return self.random_streams.phase(name=phase) if self.random_streams is not None else nullcontext()
+
     def outside_seird(self,
                       node_pop: list):
         """
@@ -129,34 +304,35 @@ class Simulator:
         """
         add to memory the epi state
         """
-        counters = [0 for i in range(5)]  # TODO: change magic number to the number of states in the epi model
-        for agent in self.population.agents:
-            counters[int(agent.e_state)] += 1
-        return counters
+        return self.population.count_states()
+
+    def gather_node_state(self):
+        """
+        The epidemiological distribution of each node
+        """
+        return self.population.count_node_states(node_count=self.graph.get_size() + 1)
 
     def get_loc_dist(self):
         """
         add to memory the epi state
         """
-        counters = [0 for i in range(
-            self.graph.get_size() + 1)]  # TODO: change magic number to the number of states in the epi model
-        for agent in self.population.agents:
-            counters[int(agent.location)] += 1
-        return counters
+        return self.population.count_locations(node_count=self.graph.get_size() + 1)
 
     # end - logic #
 
     # analysis #
 
     def get_max_infected(self):
-        return max([val[int(EpidemiologicalState.I)] for val in self.epi_dist])
+        return self.epi_dist[:, int(EpidemiologicalState.I)].max()
 
     def mean_r_zero(self):
-        return np.mean([(self.epi_dist[i + 1][int(EpidemiologicalState.I)] - self.epi_dist[i][
-            int(EpidemiologicalState.I)] + self.epi_dist[i + 1][int(EpidemiologicalState.R)] - self.epi_dist[i][
-            int(EpidemiologicalState.R)] / (self.epi_dist[i][int(EpidemiologicalState.I)]))
-                        if self.epi_dist[i][int(EpidemiologicalState.I)] > 0 else 0
-                        for i in range(len(self.epi_dist) - 1)])
+        infected = self.epi_dist[:, int(EpidemiologicalState.I)].astype(np.float64)
+        recovered = self.epi_dist[:, int(EpidemiologicalState.R)].astype(np.float64)
+        previous_infected = infected[:-1]
+        return np.mean(np.where(previous_infected > 0,
+                                infected[1:] - previous_infected + recovered[1:]
+                                - recovered[:-1] / np.where(previous_infected > 0, previous_infected, 1),
+                                0))
 
     def get_max_infected_portion(self):
         try:
@@ -177,10 +353,37 @@ class Simulator:
                          pip=self.pip,
                          max_time=self.max_time)
 
+    def clone(self,
+              columnar: bool = False):
+        """
+        A snapshot of the simulator that continues on its own - the graph, walk policy and PIP are shared as read-only
+        data and only the state is copied: the population (in bulk, for a columnar population), the step, the
+        records (in memory) and the random streams (if any).
+        With "columnar", the clone gets a columnar copy of a list-of-agents population.
+        """
+        if columnar and not isinstance(self.population, ColumnarPopulation):
+            population = ColumnarPopulation.from_population(population=self.population)
+        else:
+            population = self.population.copy()
+        answer = Simulator(population=population,
+                           graph=self.graph,
+                           walk_policy=self.walk_policy,
+                           pip=self.pip,
+                           max_time=self.max_time,
+                           random_streams=self.random_streams.copy() if self.random_streams is not None else None)
+        answer.step = self.step
+        answer._epi_dist = self._epi_dist.copy()
+        answer._node_dist = np.array(self._node_dist) if self._node_dist is not None else None
+        answer._node_dist_path = None
+        return answer
+
     def allocate_iu(self,
                     allocation: list):
+        """
+        Put IUs in the given nodes, keeping whether the current PIP finds exposed agents (a PIP without IUs does not)
+        """
         self.pip = PIPMultiAggressive(control_node_ids=allocation,
-                                      found_exposed=self.pip.found_exposed)
+                                      found_exposed=getattr(self.pip, "found_exposed", False))
 
     # end - analysis #
 
@@ -5,7 +5,6 @@ import pandas as pd
 
 # project imports
 from agent import Agent
-from node import Node
 from edge import Edge
 from graph import Graph
 from pips.pip import PIP
@@ -23,6 +22,13 @@ class SimulatorGenerator:
     A class to generate simulation settings
     """
 
+    # CONSTS #
+    REAL_WORLD_DATA_PATH = os.path.join(os.path.dirname(__file__), "real_data", "ariel_real_data.csv")
+    # END - CONSTS #
+
+    # the graph of REAL_WORLD_DATA_PATH, once it is read
+    _real_world_graph = None
+
     def __init__(self):
         pass
 
@@ -63,9 +69,7 @@ class SimulatorGenerator:
     @staticmethod
     def real_world(population_count: int = 1000,
                    max_time: int = 720):
-        edge_weights = pd.read_csv(os.path.join(os.path.dirname(__file__), "real_data", "ariel_real_data.csv"))
-        graph = Graph(nodes=[Node(id=i) for i in range(edge_weights.shape[0])],
-                      edges=Graph.table_to_edges(edge_weights.values))
+        graph = SimulatorGenerator.real_world_graph()
         population = Population.random(population_count=population_count,
                                        graph=graph)
         return Simulator(population=population,
@@ -74,6 +78,16 @@ class SimulatorGenerator:
                          pip=PIP(),
                          max_time=max_time)
 
+    @staticmethod
+    def real_world_graph() -> Graph:
+        """
+        The (array-backed) graph of the real-world data, read from the file only once
+        """
+        if SimulatorGenerator._real_world_graph is None:
+            edge_weights = pd.read_csv(SimulatorGenerator.REAL_WORLD_DATA_PATH)
+            SimulatorGenerator._real_world_graph = Graph.from_dense(matrix=edge_weights.values)
+        return SimulatorGenerator._real_world_graph.copy()
+
     @staticmethod
     def simple_random(node_count: int = 50,
                       edge_count: int = 1000,
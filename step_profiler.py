@@ -0,0 +1,108 @@
+# library imports
+import json
+import time
+import pandas as pd
+from contextlib import contextmanager
+
+# project imports
+
+
+class StepProfiler:
+    """
+    Built-in instrumentation of the simulation step - the wall time of each phase (node partitioning, SEIRD, walk, PIP
+    and gathering the state) and counters of what the step did (new infections, agents moved by the walk and agents
+    taken out of the graph by the PIP), per step and in total.
+    Phases may be nested, and a phase's time excludes the phases inside it, so the phases of a step sum to its time.
+    """
+
+    # CONSTS #
+    PHASES = ("partition", "seird", "walk", "pip", "gather")
+    COUNTERS = ("infections", "moved", "isolated")
+    # END - CONSTS #
+
+    def __init__(self):
+        # one record per profiled step
+        self.records = []
+        # the time of the phases inside each open phase
+        self._inner_times = []
+
+    def start_step(self,
+                   step: int):
+        record = {"step": step}
+        record.update({phase: 0.0 for phase in StepProfiler.PHASES})
+        record.update({counter: 0 for counter in StepProfiler.COUNTERS})
+        self.records.append(record)
+
+    @contextmanager
+    def phase(self,
+              name: str):
+        """
+        Add the time of the block (without the phases inside it) to the given phase of the current step
+        """
+        self._inner_times.append(0.0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.records[-1][name] += elapsed - self._inner_times.pop()
+            if len(self._inner_times) > 0:
+                self._inner_times[-1] += elapsed
+
+    def count(self,
+              name: str,
+              value):
+        self.records[-1][name] += value
+
+    def totals(self) -> dict:
+        """
+        The number of profiled steps, the total time of each phase and of all of them, and the total of each counter
+        """
+        answer = {"steps": len(self.records)}
+        answer.update({name: sum(record[name] for record in self.records)
+                       for name in StepProfiler.PHASES + StepProfiler.COUNTERS})
+        answer["seconds"] = sum(answer[phase] for phase in StepProfiler.PHASES)
+        return answer
+
+    def bottleneck(self) -> str:
+        """
+        The phase that took the most time so far
+        """
+        totals = self.totals()
+        return max(StepProfiler.PHASES, key=lambda phase: totals[phase])
+
+    def per_step(self) -> pd.DataFrame:
+        return pd.DataFrame(data=self.records,
+                            columns=["step"] + list(StepProfiler.PHASES) + list(StepProfiler.COUNTERS))
+
+    def report(self) -> str:
+        """
+        A human-readable summary - the time and share of each phase, and the counters
+        """
+        totals = self.totals()
+        lines = ["{} steps in {:.4f} seconds ({:.6f} per step)".format(totals["steps"],
+                                                                      totals["seconds"],
+                                                                      totals["seconds"] / max(totals["steps"], 1))]
+        for phase in sorted(StepProfiler.PHASES, key=lambda name: -totals[name]):
+            lines.append("{:<10} {:10.4f}s {:6.2f}%".format(phase,
+                                                          totals[phase],
+                                                          100 * totals[phase] / totals["seconds"] if totals["seconds"] > 0 else 0))
+        lines.extend("{:<10} {}".format(counter, totals[counter]) for counter in StepProfiler.COUNTERS)
+        return "\n".join(lines)
+
+    def save(self,
+             path: str):
+        """
+        Save the per-step records - as a CSV table if the path ends with ".csv", otherwise as JSON with the totals
+        """
+        if path.endswith(".csv"):
+            self.per_step().to_csv(path, index=False)
+        else:
+            with open(path, "w") as profile_file:
+                json.dump({"totals": self.totals(), "steps": self.records}, profile_file, indent=2)
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __str__(self):
+        return "<StepProfiler: {} steps>".format(len(self.records))
@@ -0,0 +1,137 @@
+# library imports
+import os
+import json
+import itertools
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# project imports
+
+
+class Sweep:
+    """
+    A parameter sweep given as a declarative grid - a list of {parameter: values} dicts, each expanded to all the
+    combinations of its values - where every combination is a work unit run by "unit_function(**unit)".
+    The units run on a pool of processes and each finished unit is appended to a JSON-lines checkpoint file, so an
+    interrupted sweep runs only the units that are missing when it is started again.
+    """
+
+    def __init__(self,
+                 name: str,
+                 grid: list,
+                 unit_function,
+                 checkpoint_path: str,
+                 workers: int = 1,
+                 version: str = ""):
+        self.name = name
+        self.grid = grid
+        # must be picklable (e.g., a static method) to run on the pool
+        self.unit_function = unit_function
+        self.checkpoint_path = checkpoint_path
+        self.workers = workers
+        # checkpointed units of another version (e.g., other model parameters) are not used
+        self.version = version
+
+    # logic #
+
+    def run(self) -> list:
+        """
+        Run the units that are not in the checkpoint yet, and return the (unit, result) pairs of all the units in the
+        order of the grid
+        """
+        units = Sweep.expand(grid=self.grid)
+        results = self.load_checkpoint()
+        missing = [unit for unit in units if Sweep.unit_key(unit=unit) not in results]
+        print("Sweep {}: {} units, {} already done".format(self.name, len(units), len(units) - len(missing)))
+        if self.workers <= 1:
+            for unit in missing:
+                self._finish(unit=unit,
+                             result=self.unit_function(**unit),
+                             results=results,
+                             total=len(units))
+        else:
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                futures = {pool.submit(self.unit_function, **unit): unit for unit in missing}
+                for future in as_completed(futures):
+                    self._finish(unit=futures[future],
+                                 result=future.result(),
+                                 results=results,
+                                 total=len(units))
+        return [(unit, results[Sweep.unit_key(unit=unit)]) for unit in units]
+
+    def load_checkpoint(self) -> dict:
+        """
+        The results of the units finished so far (of this version), by their unit key
+        """
+        results = {}
+        if not os.path.exists(self.checkpoint_path):
+            return results
+        with open(self.checkpoint_path, "r") as checkpoint_file:
+            for line in checkpoint_file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # a line cut by an interruption
+                    continue
+                if record.get("version") == self.version:
+                    results[Sweep.unit_key(unit=record["unit"])] = record["result"]
+        return results
+
+    def _finish(self,
+                unit: dict,
+                result,
+                results: dict,
+                total: int):
+        results[Sweep.unit_key(unit=unit)] = result
+        with open(self.checkpoint_path, "a") as checkpoint_file:
+            checkpoint_file.write(json.dumps({"version": self.version, "unit": unit, "result": result}) + "\n")
+            checkpoint_file.flush()
+            os.fsync(checkpoint_file.fileno())
+        print("Sweep {}: {}/{} ({:.2f}%) - {}".format(self.name,
+                                                      len(results),
+                                                      total,
+                                                      100 * len(results) / total,
+                                                      unit))
+
+    # end - logic #
+
+    @staticmethod
+    def expand(grid: list) -> list:
+        """
+        All the units of the grid, each sub-grid expanded in the order of its parameters
+        """
+        units = []
+        for sub_grid in grid:
+            names = list(sub_grid.keys())
+            units.extend(dict(zip(names, values)) for values in itertools.product(*[sub_grid[name] for name in names]))
+        return units
+
+    @staticmethod
+    def unit_key(unit: dict) -> str:
+        return json.dumps(unit, sort_keys=True)
+
+    @staticmethod
+    def table(results: list,
+              index: str,
+              columns: str,
+              value: str,
+              where: dict = None) -> pd.DataFrame:
+        """
+        Aggregate the (unit, result) pairs into a table - "value" of each result, with the units' "index" parameter as
+        rows and "columns" parameter as columns (in the order they first appear), for the units that match "where"
+        """
+        where = where if where is not None else {}
+        cells = {}
+        for unit, result in results:
+            if all(unit[name] == wanted for name, wanted in where.items()):
+                cells.setdefault(unit[index], {})[unit[columns]] = result[value]
+        column_values = list(dict.fromkeys(column for row in cells.values() for column in row))
+        return pd.DataFrame(data=[[row.get(column) for column in column_values] for row in cells.values()],
+                            index=list(cells.keys()),
+                            columns=column_values)
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __str__(self):
+        return "<Sweep: {}>".format(self.name)
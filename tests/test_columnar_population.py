@@ -0,0 +1,66 @@
+# library imports
+import unittest
+import numpy as np
+
+# project imports
+from graph import Graph
+from sim import Simulator
+from pips.pip import PIP
+from walks.walk import Walk
+from seird_parms import SEIRDparameter
+from random_streams import RandomStreams
+from columnar_population import ColumnarPopulation
+from pips.multi_aggressive_pip import PIPMultiAggressive
+from walks.walk_random_with_stay import WalkRandomWithStay
+
+
+class TestColumnarPopulation(unittest.TestCase):
+    """
+    A columnar population against a list of "Agent" objects - the same simulation step by step
+    """
+
+    # CONSTS #
+    SEED = 0
+    STREAMS_SEED = 3
+    NODE_COUNT = 30
+    AGENT_COUNT = 500
+    STEPS = 20
+    # END - CONSTS #
+
+    def setUp(self):
+        self.psi = SEIRDparameter.psi
+
+    def tearDown(self):
+        SEIRDparameter.psi = self.psi
+
+    def test_same_run_as_agents(self):
+        np.random.seed(TestColumnarPopulation.SEED)
+        graph = Graph.erdos_renyi(node_count=TestColumnarPopulation.NODE_COUNT,
+                                  edge_count=3 * TestColumnarPopulation.NODE_COUNT)
+        population = ColumnarPopulation.random(population_count=TestColumnarPopulation.AGENT_COUNT,
+                                               graph=graph,
+                                               infect_portion=0.05)
+        # the two populations draw the deaths from different generators, so only the sure outcome is compared
+        SEIRDparameter.psi = 0
+        scenarios = [(Walk, PIP),
+                     (WalkRandomWithStay, PIP),
+                     (Walk, lambda: PIPMultiAggressive(control_node_ids=[0, 1, 2]))]
+        for walk_class, pip_function in scenarios:
+            # the same random streams, so both populations see the same walk and PIP draws
+            sims = [Simulator(population=this_population,
+                              graph=graph,
+                              walk_policy=walk_class(),
+                              pip=pip_function(),
+                              max_time=TestColumnarPopulation.STEPS,
+                              random_streams=RandomStreams(seed=TestColumnarPopulation.STREAMS_SEED))
+                    for this_population in (population.copy(), population.to_population())]
+            for _ in range(TestColumnarPopulation.STEPS):
+                [sim.run_step() for sim in sims]
+                columnar, agents = sims[0].population, sims[1].population
+                self.assertEqual(columnar.e_states.tolist(), [int(agent.e_state) for agent in agents.agents])
+                self.assertEqual(columnar.locations.tolist(), [agent.location for agent in agents.agents])
+            self.assertTrue(np.array_equal(sims[0].epi_dist, sims[1].epi_dist))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+# library imports
+import os
+import unittest
+import tempfile
+import numpy as np
+
+# project imports
+from edge import Edge
+from node import Node
+from graph import Graph
+
+
+class TestGraph(unittest.TestCase):
+    """
+    The graph's CSR index, loaders and generators
+    """
+
+    def test_index_follows_new_edges(self):
+        graph = Graph(nodes=[Node(id=i) for i in range(3)],
+                      edges=[Edge(s_id=0, t_id=1, w=1), Edge(s_id=1, t_id=2, w=1)])
+        self.assertEqual(graph.next_nodes(id=0), [1])
+        # the same number of edges, so only setting the edges again can tell the index
+        graph.edges = [Edge(s_id=0, t_id=2, w=1), Edge(s_id=1, t_id=2, w=1)]
+        self.assertEqual(graph.next_nodes(id=0), [2])
+
+    def test_edges_cannot_change_in_place(self):
+        graph = Graph(nodes=[Node(id=i) for i in range(3)],
+                      edges=[Edge(s_id=0, t_id=1, w=1)])
+        with self.assertRaises(TypeError):
+            graph.edges[0] = Edge(s_id=0, t_id=2, w=1)
+        with self.assertRaises(AttributeError):
+            graph.edges[0].t_id = 2
+        self.assertEqual(graph.next_nodes(id=0), [1])
+
+    def test_edge_list_separators(self):
+        lines = {"commas": "# source, target, weight\n0, 1, 2\n1,2,1\n",
+                 "whitespace": "# source target weight\n0 1 2\n1\t2   1\n"}
+        with tempfile.TemporaryDirectory() as folder:
+            for name, content in lines.items():
+                path = os.path.join(folder, name + ".txt")
+                with open(path, "w") as edge_file:
+                    edge_file.write(content)
+                graph = Graph.from_edge_list(path=path)
+                self.assertEqual(graph.get_size(), 3)
+                self.assertEqual(graph.next_nodes_with_weight(id=0), ([1], [2.0]))
+                self.assertEqual(graph.next_nodes_with_weight(id=1), ([2], [1.0]))
+
+    def test_barabasi_albert_chunks(self):
+        chunk_size = Graph.RANDOM_CHUNK_SIZE
+        graphs = []
+        try:
+            # a chunk smaller than the picks of a single node, and one larger than all the picks
+            for Graph.RANDOM_CHUNK_SIZE in (2, 10 ** 6):
+                np.random.seed(0)
+                graphs.append(Graph.barabasi_albert(node_count=200,
+                                                    attach_count=3))
+        finally:
+            Graph.RANDOM_CHUNK_SIZE = chunk_size
+        offsets, targets, _ = graphs[0].get_csr()
+        self.assertTrue(np.array_equal(offsets, graphs[1].get_csr()[0]))
+        self.assertTrue(np.array_equal(targets, graphs[1].get_csr()[1]))
+        self.assertEqual(len(targets), 2 * 3 * (200 - 3))
+        self.assertGreaterEqual(np.diff(offsets)[3:].min(), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+# library imports
+import unittest
+import numpy as np
+
+# project imports
+from multi_sim import MultiSim
+from sim_generator import SimulatorGenerator
+from mean_field_sim import MeanFieldSimulator
+from epidemiological_state import EpidemiologicalState
+from find_optimal_iu_allocation import OptimalInspectionUnitsAllocation
+
+
+class TestMeanFieldSimulator(unittest.TestCase):
+    """
+    The mean-field surrogate against the agent model it screens for
+    """
+
+    # CONSTS #
+    SEED = 1
+    REPEATS = 10
+    # END - CONSTS #
+
+    def setUp(self):
+        MultiSim.seed_all(seed=TestMeanFieldSimulator.SEED)
+        self.sim = SimulatorGenerator.simple_random_aggressive_controlled(node_count=8,
+                                                                          edge_count=24,
+                                                                          max_time=40,
+                                                                          population_count=400)
+        self.allocations = [list(range(iu_count)) for iu_count in (0, 2, 4, 6, 8)]
+
+    def test_infected_die_out(self):
+        sim = MeanFieldSimulator.from_simulator(sim=self.sim)
+        sim.allocate_iu(allocation=list(range(8)))
+        sim.run()
+        self.assertEqual(sim.epi_dist[-1, int(EpidemiologicalState.E)], 0)
+        self.assertEqual(sim.epi_dist[-1, int(EpidemiologicalState.I)], 0)
+
+    def test_scores_track_agent_model(self):
+        agent_sim = OptimalInspectionUnitsAllocation._base(sim=self.sim,
+                                                           engine=MeanFieldSimulator.AGENT_ENGINE)
+        mean_field_sim = OptimalInspectionUnitsAllocation._base(sim=self.sim,
+                                                                engine=MeanFieldSimulator.MEAN_FIELD_ENGINE)
+        agent_scores = [OptimalInspectionUnitsAllocation.evaluate(sim=agent_sim,
+                                                                  allocation=allocation,
+                                                                  repeat_stochastic=TestMeanFieldSimulator.REPEATS,
+                                                                  seeds=list(range(TestMeanFieldSimulator.REPEATS)))
+                        for allocation in self.allocations]
+        mean_field_scores = [OptimalInspectionUnitsAllocation.evaluate(sim=mean_field_sim,
+                                                                       allocation=allocation)
+                             for allocation in self.allocations]
+        self.assertTrue(np.all(np.isfinite(mean_field_scores)))
+        # the same scale and the same ranking of the allocations
+        self.assertLess(max(mean_field_scores), 2 * max(agent_scores))
+        self.assertGreater(np.corrcoef(agent_scores, mean_field_scores)[0, 1], 0.7)
+        self.assertLess(mean_field_scores[-1], mean_field_scores[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
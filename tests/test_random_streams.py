@@ -0,0 +1,57 @@
+# library imports
+import unittest
+import numpy as np
+
+# project imports
+from multi_sim import MultiSim
+from sim_generator import SimulatorGenerator
+from find_optimal_iu_allocation import OptimalInspectionUnitsAllocation
+
+
+class TestRandomStreams(unittest.TestCase):
+    """
+    Common random numbers - runs of different IU allocations on the same seeds stay paired
+    """
+
+    # CONSTS #
+    SEED = 0
+    REPEATS = 20
+    # END - CONSTS #
+
+    def test_common_random_numbers_reduce_variance(self):
+        MultiSim.seed_all(seed=TestRandomStreams.SEED)
+        sim = OptimalInspectionUnitsAllocation._base(
+            sim=SimulatorGenerator.simple_random_aggressive_controlled(node_count=20,
+                                                                       edge_count=60,
+                                                                       max_time=30,
+                                                                       population_count=400),
+            engine="agent")
+        seeds = MultiSim.replicate_seeds(seed=TestRandomStreams.SEED,
+                                         repeat_times=2 * TestRandomStreams.REPEATS)
+        paired_seeds = seeds[:TestRandomStreams.REPEATS]
+        other_seeds = seeds[TestRandomStreams.REPEATS:]
+        # two allocations that differ by one node, as the candidates of a greedy round
+        first = [0, 1, 2, 3, 4]
+        second = [0, 1, 2, 3, 5]
+        first_scores = np.array([OptimalInspectionUnitsAllocation.evaluate(sim=sim, allocation=first, seeds=[seed])
+                                 for seed in paired_seeds])
+        paired_scores = np.array([OptimalInspectionUnitsAllocation.evaluate(sim=sim, allocation=second, seeds=[seed])
+                                  for seed in paired_seeds])
+        independent_scores = np.array([OptimalInspectionUnitsAllocation.evaluate(sim=sim, allocation=second, seeds=[seed])
+                                       for seed in other_seeds])
+        self.assertLess(np.var(first_scores - paired_scores), 0.5 * np.var(first_scores - independent_scores))
+
+    def test_same_seed_same_run(self):
+        MultiSim.seed_all(seed=TestRandomStreams.SEED)
+        sim = OptimalInspectionUnitsAllocation._base(
+            sim=SimulatorGenerator.simple_random_aggressive_controlled(node_count=10,
+                                                                       edge_count=30,
+                                                                       max_time=20,
+                                                                       population_count=200),
+            engine="agent")
+        self.assertEqual(OptimalInspectionUnitsAllocation.evaluate(sim=sim, allocation=[0], seeds=[7]),
+                         OptimalInspectionUnitsAllocation.evaluate(sim=sim, allocation=[0], seeds=[7]))
+
+
+if __name__ == '__main__':
+    unittest.main()
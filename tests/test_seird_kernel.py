@@ -0,0 +1,63 @@
+# library imports
+import unittest
+import numpy as np
+
+# project imports
+from graph import Graph
+from sim import Simulator
+from pips.pip import PIP
+from walks.walk import Walk
+from seird_kernel import SEIRDkernel
+from seird_parms import SEIRDparameter
+from columnar_population import ColumnarPopulation
+
+
+class TestSEIRDkernel(unittest.TestCase):
+    """
+    The vectorized SEIRD step of a columnar population against the node after node loop on the same agents
+    """
+
+    # CONSTS #
+    SEED = 0
+    NODE_COUNT = 10
+    AGENT_COUNT = 300
+    STEPS = 15
+    # END - CONSTS #
+
+    def setUp(self):
+        self.psi = SEIRDparameter.psi
+
+    def tearDown(self):
+        SEIRDparameter.psi = self.psi
+
+    def test_same_as_loop(self):
+        np.random.seed(TestSEIRDkernel.SEED)
+        graph = Graph.erdos_renyi(node_count=TestSEIRDkernel.NODE_COUNT,
+                                  edge_count=3 * TestSEIRDkernel.NODE_COUNT)
+        # some agents outside the graph, some masked, and E and I agents with timers part way through
+        population = ColumnarPopulation(e_states=np.random.choice([0, 0, 0, 1, 2], size=TestSEIRDkernel.AGENT_COUNT),
+                                        locations=np.random.randint(0, TestSEIRDkernel.NODE_COUNT + 1,
+                                                                    size=TestSEIRDkernel.AGENT_COUNT),
+                                        timers=np.random.randint(0, 5, size=TestSEIRDkernel.AGENT_COUNT),
+                                        masks=np.random.random(TestSEIRDkernel.AGENT_COUNT) < 0.3)
+        # the loop and the kernel draw the deaths from different generators, so only the sure outcomes are compared
+        for psi in (0, 1):
+            SEIRDparameter.psi = psi
+            kernel_population = population.copy()
+            loop_sim = Simulator(population=population.to_population(),
+                                 graph=graph,
+                                 walk_policy=Walk(),
+                                 pip=PIP(),
+                                 max_time=TestSEIRDkernel.STEPS)
+            for _ in range(TestSEIRDkernel.STEPS):
+                SEIRDkernel.run(population=kernel_population,
+                                node_count=graph.get_size())
+                loop_sim.seird_step()
+                self.assertEqual(kernel_population.e_states.tolist(),
+                                 [int(agent.e_state) for agent in loop_sim.population.agents])
+                self.assertEqual(kernel_population.timers.tolist(),
+                                 [agent.timer for agent in loop_sim.population.agents])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,30 @@
+# library imports
+import unittest
+import numpy as np
+
+# project imports
+from graph import Graph
+from walks.walk_random_with_weighted_stay import WalkRandomWithWeightedStay
+
+
+class TestWalks(unittest.TestCase):
+    """
+    The transition tables of the walks
+    """
+
+    def test_weighted_stay_with_zero_weights(self):
+        # the edges of node 0 all weigh 0, so its agents stay
+        graph = Graph.from_arrays(s_ids=np.array([0, 0, 1, 2]),
+                                  t_ids=np.array([1, 2, 2, 0]),
+                                  weights=np.array([0.0, 0.0, 1.0, 1.0]))
+        walk = WalkRandomWithWeightedStay(weight=0.3)
+        _, _, weights = walk.transition_weights(graph=graph)
+        self.assertFalse(np.any(np.isnan(weights)))
+        np.random.seed(0)
+        table = walk.get_transition_table(graph=graph)
+        self.assertTrue(np.all(table.draw(locations=np.zeros(100, dtype=np.int64)) == 0))
+        self.assertGreater(np.mean(table.draw(locations=np.ones(1000, dtype=np.int64)) == 1), 0.2)
+
+
+if __name__ == '__main__':
+    unittest.main()
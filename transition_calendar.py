@@ -0,0 +1,93 @@
+# library imports
+import math
+import numpy as np
+
+# project imports
+from seird_parms import SEIRDparameter
+from epidemiological_state import EpidemiologicalState
+
+
+class TransitionCalendar:
+    """
+    A bucketed calendar of the timed transitions (E->I and I->R/D) of a columnar population.
+    When an agent enters E or I it is queued in the bucket of the population clock in which its timer reaches phi or
+    gamma, so each step only handles the agents that are due instead of ticking and checking everyone.
+    Entries are checked again when they are due, so agents whose state or timer changed in the meantime are skipped.
+    """
+
+    def __init__(self):
+        self.buckets = {}
+
+    @staticmethod
+    def delay(e_state: EpidemiologicalState):
+        """
+        The number of steps (of the timer) an agent stays in the given state
+        """
+        return math.ceil(SEIRDparameter.phi if e_state == EpidemiologicalState.E else SEIRDparameter.gamma)
+
+    def schedule(self,
+                 population,
+                 indices: np.ndarray,
+                 e_state: EpidemiologicalState):
+        """
+        Queue the transition out of "e_state" for the given agents (that are in this state now)
+        """
+        if e_state not in (EpidemiologicalState.E, EpidemiologicalState.I) or len(indices) == 0:
+            return
+        # the first clock, after the next tic, in which the timer is at least the state's delay
+        due_clocks = np.maximum(population.timer_origins[indices] + TransitionCalendar.delay(e_state=e_state),
+                                population.clock + 1)
+        first_due = int(due_clocks[0])
+        if np.all(due_clocks == first_due):
+            self.buckets.setdefault(first_due, []).append((indices, int(e_state)))
+            return
+        for due_clock in np.unique(due_clocks).tolist():
+            self.buckets.setdefault(due_clock, []).append((indices[due_clocks == due_clock], int(e_state)))
+
+    def rebuild(self,
+                population):
+        """
+        Queue all the E and I agents of the population again
+        """
+        self.buckets = {}
+        for e_state in (EpidemiologicalState.E, EpidemiologicalState.I):
+            self.schedule(population=population,
+                          indices=np.flatnonzero(population.e_states == e_state),
+                          e_state=e_state)
+
+    def pop_due(self,
+                population,
+                e_state: EpidemiologicalState) -> np.ndarray:
+        """
+        Remove and return the agents in "e_state" whose transition out of it is due at the population's current clock
+        """
+        due_keys = [key for key in self.buckets if key <= population.clock]
+        candidates = []
+        for key in due_keys:
+            entries = self.buckets[key]
+            candidates.extend(indices for indices, state in entries if state == int(e_state))
+            entries = [(indices, state) for indices, state in entries if state != int(e_state)]
+            if len(entries) > 0:
+                self.buckets[key] = entries
+            else:
+                del self.buckets[key]
+        if len(candidates) == 0:
+            return np.zeros(0, dtype=np.int64)
+        candidates = np.unique(np.concatenate(candidates))
+        timers = population.clock - population.timer_origins[candidates]
+        return candidates[(population.e_states[candidates] == e_state)
+                          & (timers >= TransitionCalendar.delay(e_state=e_state))]
+
+    def copy(self):
+        """
+        A copy with its own buckets, sharing the queued index arrays (they are never changed in place)
+        """
+        answer = TransitionCalendar()
+        answer.buckets = {key: list(entries) for key, entries in self.buckets.items()}
+        return answer
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __str__(self):
+        return "<TransitionCalendar: buckets={}>".format(len(self.buckets))
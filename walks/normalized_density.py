@@ -1,20 +1,30 @@
 # library imports
-import random
+import numpy as np
 
 # project imports
 from walks.walk import Walk
 from graph import Graph
+from jit_kernels import JitKernels
 from population import Population
+from columnar_population import ColumnarPopulation
 from epidemiological_state import EpidemiologicalState
 
 
 class WalkNormalizedDensity(Walk):
     """
-    A population walk to the locations with minimal number of agents
+    A population walk to the locations with minimal number of agents.
+    By default the agents move one after the other, in the population's order, each to the emptiest node among the
+    next nodes and its own ("fill the emptiest neighbor") - a compiled loop if numba is installed (see "JitKernels").
+    In "batched" mode the agents are handled node after node, so all the decisions of a node are resolved together:
+    its agents fill the emptiest neighbors until their own node is the emptiest, and then the rest of them stay.
+    This is the same rule with the agents visited grouped by node - deterministic, and it only iterates over the
+    agents that actually move.
     """
 
-    def __init__(self):
+    def __init__(self,
+                 batched: bool = False):
         Walk.__init__(self)
+        self.batched = batched
 
     def run(self,
             population: Population,
@@ -22,30 +32,118 @@ class WalkNormalizedDensity(Walk):
         """
         Changes the locations of the individuals according to some logic
         """
+        if isinstance(population, ColumnarPopulation):
+            live_indices = population.live_indices()
+            locations = population.locations[live_indices].astype(np.int64)
+        else:
+            live_agents = [agent for agent in population.agents if agent.e_state != EpidemiologicalState.D]
+            locations = np.array([agent.location for agent in live_agents], dtype=np.int64)
         # find agents in each place
-        loc_counters = {id: 0 for id in range(graph.get_size())}
-        for agent in population.agents:
-            if agent.location != graph.get_size():
-                loc_counters[agent.location] +=1
+        loc_counters = population.count_locations(node_count=graph.get_size() + 1)
+        if self.batched:
+            locations = self.node_batched_walk(locations=locations,
+                                               loc_counters=loc_counters,
+                                               graph=graph,
+                                               population_size=population.get_size())
+        elif JitKernels.ENABLED:
+            offsets, targets, _ = graph.get_csr()
+            locations = JitKernels.normalized_density_walk(locations=locations,
+                                                           loc_counters=loc_counters,
+                                                           offsets=offsets,
+                                                           targets=targets,
+                                                           population_size=population.get_size(),
+                                                           default_id=graph.get_size()).tolist()
+        else:
+            locations = self.sequential_walk(locations=locations.tolist(),
+                                             loc_counters=loc_counters,
+                                             graph=graph,
+                                             population_size=population.get_size())
         # updat locations
-        for agent in population.agents:
-            if agent.e_state != EpidemiologicalState.D:
-                possible_locations = graph.next_nodes(id=agent.location)
-                possible_locations.append(agent.location)
-                if len(possible_locations) > 1:
-                    # count the amount if agents in each node
-                    min_pop_count = population.get_size()+1
-                    min_pop_id = graph.get_size()
-                    for possible_location in possible_locations:
-                        if loc_counters[possible_location] < min_pop_count:
-                            min_pop_count = loc_counters[possible_location]
-                            min_pop_id = possible_location
-                    # update so people can go to the right location
-                    loc_counters[min_pop_id] += 1
-                    loc_counters[agent.location] -= 1
-                    agent.location = min_pop_id
+        if isinstance(population, ColumnarPopulation):
+            population.set_location(indices=live_indices,
+                                    new_locations=locations)
+        else:
+            for agent, new_location in zip(live_agents, locations):
+                agent.location = new_location
         return population
 
+    @staticmethod
+    def sequential_walk(locations: list,
+                        loc_counters: list,
+                        graph: Graph,
+                        population_size: int) -> list:
+        """
+        Move the agents one after the other to the emptiest node among the next nodes and their own
+        """
+        offsets, targets, _ = graph.get_csr()
+        offsets = offsets.tolist()
+        targets = targets.tolist()
+        row_count = len(offsets) - 1
+        for position, location in enumerate(locations):
+            if location >= row_count or offsets[location] == offsets[location + 1]:
+                continue
+            possible_locations = targets[offsets[location]:offsets[location + 1]]
+            possible_locations.append(location)
+            min_pop_id = WalkNormalizedDensity._emptiest(possible_locations=possible_locations,
+                                                         loc_counters=loc_counters,
+                                                         population_size=population_size,
+                                                         default_id=graph.get_size())
+            # update so people can go to the right location
+            loc_counters[min_pop_id] += 1
+            loc_counters[location] -= 1
+            locations[position] = min_pop_id
+        return locations
+
+    @staticmethod
+    def node_batched_walk(locations: np.ndarray,
+                          loc_counters: list,
+                          graph: Graph,
+                          population_size: int) -> list:
+        """
+        Move the agents node after node, each node's agents fill the emptiest nodes until their own node is the emptiest
+        """
+        offsets, targets, _ = graph.get_csr()
+        offsets = offsets.tolist()
+        targets = targets.tolist()
+        row_count = len(offsets) - 1
+        order = np.argsort(locations, kind="stable")
+        node_ids, starts = np.unique(locations[order], return_index=True)
+        node_agents = np.split(order, starts[1:]) if len(order) > 0 else []
+        locations = locations.tolist()
+        for node_id, agent_positions in zip(node_ids.tolist(), node_agents):
+            if node_id >= row_count or offsets[node_id] == offsets[node_id + 1]:
+                continue
+            possible_locations = targets[offsets[node_id]:offsets[node_id + 1]]
+            possible_locations.append(node_id)
+            for position in agent_positions.tolist():
+                min_pop_id = WalkNormalizedDensity._emptiest(possible_locations=possible_locations,
+                                                             loc_counters=loc_counters,
+                                                             population_size=population_size,
+                                                             default_id=graph.get_size())
+                # staying changes nothing, so the rest of the node's agents stay as well
+                if min_pop_id == node_id:
+                    break
+                loc_counters[min_pop_id] += 1
+                loc_counters[node_id] -= 1
+                locations[position] = min_pop_id
+        return locations
+
+    @staticmethod
+    def _emptiest(possible_locations: list,
+                  loc_counters: list,
+                  population_size: int,
+                  default_id: int) -> int:
+        """
+        The first of the possible locations with the minimal number of agents
+        """
+        min_pop_count = population_size + 1
+        min_pop_id = default_id
+        for possible_location in possible_locations:
+            if loc_counters[possible_location] < min_pop_count:
+                min_pop_count = loc_counters[possible_location]
+                min_pop_id = possible_location
+        return min_pop_id
+
     def __repr__(self):
         return self.__str__()
 
@@ -0,0 +1,105 @@
+# library imports
+import numpy as np
+
+# project imports
+
+
+class TransitionTable:
+    """
+    The per-node next location distribution of a walk policy, compiled once per graph into cumulative weights so the
+    new locations of any number of agents are found with a single vectorized draw.
+    Row i holds the options targets[offsets[i]:offsets[i+1]], stored as i + (cumulative weight / row total) so all
+    the rows are searched together. An agent in a node without options stays in place.
+    """
+
+    def __init__(self,
+                 offsets: np.ndarray,
+                 targets: np.ndarray,
+                 keys: np.ndarray):
+        self.offsets = offsets
+        self.targets = targets
+        self.keys = keys
+
+    def get_row_count(self) -> int:
+        return len(self.offsets) - 1
+
+    def draw(self,
+             locations: np.ndarray,
+             uniforms: np.ndarray = None) -> np.ndarray:
+        """
+        Pick the next location of agents that are currently in the given locations, with one uniform number per agent
+        (drawn here if not given)
+        """
+        answer = np.array(locations, dtype=np.int64)
+        if uniforms is None:
+            uniforms = np.random.random(len(answer))
+        movable = np.flatnonzero(answer < self.get_row_count())
+        rows = answer[movable]
+        movable = movable[self.offsets[rows + 1] > self.offsets[rows]]
+        rows = answer[movable]
+        positions = np.searchsorted(self.keys, rows + uniforms[movable], side="right")
+        # guard against float rounding of row + u to row + 1
+        positions = np.minimum(positions, self.offsets[rows + 1] - 1)
+        answer[movable] = self.targets[positions]
+        return answer
+
+    @staticmethod
+    def compile(offsets: np.ndarray,
+                targets: np.ndarray,
+                weights: np.ndarray):
+        """
+        Build the table from (non-negative) per-node weights given in a CSR layout
+        """
+        row_count = len(offsets) - 1
+        degrees = np.diff(offsets)
+        rows = np.repeat(np.arange(row_count), degrees)
+        cumulative = np.cumsum(weights, dtype=np.float64)
+        row_starts = np.concatenate(([0], cumulative))[offsets[:-1]]
+        row_totals = np.concatenate(([0], cumulative))[offsets[1:]] - row_starts
+        safe_totals = np.where(row_totals > 0, row_totals, 1)
+        keys = rows + (cumulative - row_starts[rows]) / safe_totals[rows]
+        # close each row exactly so a draw never leaks into the next row
+        keys[offsets[1:][degrees > 0] - 1] = np.arange(row_count)[degrees > 0] + 1
+        return TransitionTable(offsets=np.asarray(offsets, dtype=np.int64),
+                               targets=np.asarray(targets, dtype=np.int64),
+                               keys=keys)
+
+    @staticmethod
+    def add_stay(offsets: np.ndarray,
+                 targets: np.ndarray,
+                 weights: np.ndarray,
+                 stay_weights: np.ndarray):
+        """
+        Append the node itself, with the given weight, as the last option of every node that has other options
+        """
+        row_count = len(offsets) - 1
+        degrees = np.diff(offsets)
+        stay_rows = np.flatnonzero(degrees > 0)
+        new_offsets = np.zeros(row_count + 1, dtype=np.int64)
+        np.cumsum(degrees + (degrees > 0), out=new_offsets[1:])
+        new_targets = np.empty(new_offsets[-1], dtype=np.int64)
+        new_weights = np.empty(new_offsets[-1], dtype=np.float64)
+        # the old options keep their order, the stay option goes right after them
+        old_positions = np.arange(len(targets)) + np.repeat(new_offsets[:-1] - offsets[:-1], degrees)
+        new_targets[old_positions] = targets
+        new_weights[old_positions] = weights
+        new_targets[new_offsets[stay_rows + 1] - 1] = stay_rows
+        new_weights[new_offsets[stay_rows + 1] - 1] = np.broadcast_to(stay_weights, (row_count,))[stay_rows]
+        return new_offsets, new_targets, new_weights
+
+    @staticmethod
+    def pad_rows(offsets: np.ndarray,
+                 row_count: int):
+        """
+        Make sure the CSR layout has (at least) the given number of rows, the new ones without options
+        """
+        if len(offsets) - 1 >= row_count:
+            return offsets
+        return np.concatenate((offsets, np.full(row_count - len(offsets) + 1, offsets[-1], dtype=offsets.dtype)))
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __str__(self):
+        return "<TransitionTable: rows={}, options={}>".format(self.get_row_count(),
+                                                               len(self.targets))
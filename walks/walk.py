@@ -1,8 +1,12 @@
 # library imports
+import numpy as np
 
 # project imports
 from graph import Graph
 from population import Population
+from walks.transition_table import TransitionTable
+from columnar_population import ColumnarPopulation
+from epidemiological_state import EpidemiologicalState
 
 
 class Walk:
@@ -10,8 +14,17 @@ class Walk:
     An abstract class for the walk operation
     """
 
+    # CONSTS #
+
+    # True if every agent picks its next location independently of the others, so the walk is fully described by
+    # its transition table (see "transition_weights")
+    INDEPENDENT_MOVES = False
+
+    # END - CONSTS #
+
     def __init__(self):
-        pass
+        self._transition_table = None
+        self._transition_csr = None
 
     def run(self,
             population: Population,
@@ -21,6 +34,58 @@ class Walk:
         """
         return population
 
+    # batched walk #
+
+    def transition_weights(self,
+                           graph: Graph):
+        """
+        The (offsets, targets, weights) CSR layout of the next location options of each node, for walks where every
+        agent picks its next location independently of the others - no options (everyone stays) by default
+        """
+        return np.zeros(graph.get_size() + 1, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+
+    def get_transition_table(self,
+                             graph: Graph) -> TransitionTable:
+        """
+        The compiled transition table of this walk on the given graph, compiled again only if the graph's edges changed
+        """
+        csr = graph.get_csr()
+        if self._transition_table is None or self._transition_csr is not csr:
+            offsets, targets, weights = self.transition_weights(graph=graph)
+            self._transition_table = TransitionTable.compile(offsets=TransitionTable.pad_rows(offsets=offsets,
+                                                                                              row_count=graph.get_size() + 1),
+                                                             targets=targets,
+                                                             weights=weights)
+            self._transition_csr = csr
+        return self._transition_table
+
+    def run_batched(self,
+                    population: Population,
+                    graph: Graph) -> Population:
+        """
+        Move all the alive agents with one draw from the walk's transition table, dead agents stay in place.
+        Every agent has its own uniform number (by its index), so the same random stream moves the same agent the same
+        way whatever the other agents do.
+        """
+        table = self.get_transition_table(graph=graph)
+        uniforms = np.random.random(population.get_size())
+        if isinstance(population, ColumnarPopulation):
+            live_indices = population.live_indices()
+            population.set_location(indices=live_indices,
+                                    new_locations=table.draw(locations=population.locations[live_indices],
+                                                             uniforms=uniforms[live_indices]))
+        else:
+            agents = population.agents
+            live_indices = [index for index, agent in enumerate(agents) if agent.e_state != EpidemiologicalState.D]
+            new_locations = table.draw(locations=np.array([agents[index].location for index in live_indices],
+                                                          dtype=np.int64),
+                                       uniforms=uniforms[live_indices])
+            for index, new_location in zip(live_indices, new_locations.tolist()):
+                agents[index].location = new_location
+        return population
+
+    # end - batched walk #
+
     def __repr__(self):
         return self.__str__()
 
@@ -1,11 +1,9 @@
 # library imports
-import random
 
 # project imports
 from walks.walk import Walk
 from graph import Graph
 from population import Population
-from epidemiological_state import EpidemiologicalState
 
 
 class WalkRandom(Walk):
@@ -13,6 +11,12 @@ class WalkRandom(Walk):
     A population random walk
     """
 
+    # CONSTS #
+
+    INDEPENDENT_MOVES = True
+
+    # END - CONSTS #
+
     def __init__(self):
         Walk.__init__(self)
 
@@ -22,13 +26,15 @@ class WalkRandom(Walk):
         """
         Changes the locations of the individuals according to some logic
         """
-        for agent in population.agents:
-            if agent.e_state != EpidemiologicalState.D:
-                possible_locations, weights = graph.next_nodes_with_weight(id=agent.location)
-                if len(possible_locations) > 0:
-                    picked_location = random.choices(possible_locations, weights)[0]
-                    agent.location = picked_location
-        return population
+        return self.run_batched(population=population,
+                                graph=graph)
+
+    def transition_weights(self,
+                           graph: Graph):
+        """
+        Go to one of the next nodes, with the edges' weights
+        """
+        return graph.get_csr()
 
     def __repr__(self):
         return self.__str__()
@@ -1,11 +1,11 @@
 # library imports
-import random
+import numpy as np
 
 # project imports
 from walks.walk import Walk
 from graph import Graph
 from population import Population
-from epidemiological_state import EpidemiologicalState
+from walks.transition_table import TransitionTable
 
 
 class WalkRandomWithStay(Walk):
@@ -13,6 +13,12 @@ class WalkRandomWithStay(Walk):
     A population random walk that allows to stay in the same node
     """
 
+    # CONSTS #
+
+    INDEPENDENT_MOVES = True
+
+    # END - CONSTS #
+
     def __init__(self):
         Walk.__init__(self)
 
@@ -22,17 +28,19 @@ class WalkRandomWithStay(Walk):
         """
         Changes the locations of the individuals according to some logic
         """
-        for agent in population.agents:
-            if agent.e_state != EpidemiologicalState.D:
-                possible_locations, weights = graph.next_nodes_with_weight(id=agent.location)
-                if len(possible_locations) > 0:
-                    # count this node as well
-                    possible_locations.append(agent.location)
-                    weights.append(1/len(weights))
-                    # pick one
-                    picked_location = random.choices(possible_locations, weights)[0]
-                    agent.location = picked_location
-        return population
+        return self.run_batched(population=population,
+                                graph=graph)
+
+    def transition_weights(self,
+                           graph: Graph):
+        """
+        Go to one of the next nodes with the edges' weights, or count this node as well with weight 1/(out degree)
+        """
+        offsets, targets, weights = graph.get_csr()
+        return TransitionTable.add_stay(offsets=offsets,
+                                        targets=targets,
+                                        weights=weights,
+                                        stay_weights=1 / np.maximum(np.diff(offsets), 1))
 
     def __repr__(self):
         return self.__str__()
@@ -1,11 +1,11 @@
 # library imports
-import random
+import numpy as np
 
 # project imports
 from walks.walk import Walk
 from graph import Graph
 from population import Population
-from epidemiological_state import EpidemiologicalState
+from walks.transition_table import TransitionTable
 
 
 class WalkRandomWithWeightedStay(Walk):
@@ -13,6 +13,12 @@ class WalkRandomWithWeightedStay(Walk):
     A population random walk that allows to stay in the same node
     """
 
+    # CONSTS #
+
+    INDEPENDENT_MOVES = True
+
+    # END - CONSTS #
+
     def __init__(self,
                  weight: float = 0.5):
         Walk.__init__(self)
@@ -24,14 +30,25 @@ class WalkRandomWithWeightedStay(Walk):
         """
         Changes the locations of the individuals according to some logic
         """
-        for agent in population.agents:
-            if agent.e_state != EpidemiologicalState.D:
-                possible_locations, weights = graph.next_nodes_with_weight(id=agent.location)
-                if len(possible_locations) > 0 and random.random() > self.weight:
-                    # pick one non this one
-                    picked_location = random.choices(possible_locations, weights)[0]
-                    agent.location = picked_location
-        return population
+        return self.run_batched(population=population,
+                                graph=graph)
+
+    def transition_weights(self,
+                           graph: Graph):
+        """
+        Stay in this node with probability "weight", otherwise go to one of the next nodes with the edges' weights (a
+        node whose edges all weigh 0 keeps its agents)
+        """
+        offsets, targets, weights = graph.get_csr()
+        degrees = np.diff(offsets)
+        rows = np.repeat(np.arange(len(degrees)), degrees)
+        row_totals = np.bincount(rows, weights=weights, minlength=len(degrees))
+        can_move = row_totals > 0
+        move_weights = np.where(can_move[rows], weights / np.where(can_move, row_totals, 1)[rows], 0) * (1 - self.weight)
+        return TransitionTable.add_stay(offsets=offsets,
+                                        targets=targets,
+                                        weights=move_weights,
+                                        stay_weights=np.where(can_move, self.weight, 1))
 
     def __repr__(self):
         return self.__str__()
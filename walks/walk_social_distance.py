@@ -1,22 +1,33 @@
 # library imports
-import random
+import numpy as np
 
 # project imports
 from walks.walk import Walk
 from graph import Graph
+from jit_kernels import JitKernels
 from population import Population
+from walks.transition_table import TransitionTable
+from columnar_population import ColumnarPopulation
 from epidemiological_state import EpidemiologicalState
 
 
 class WalkSocialDistance(Walk):
     """
-    A population random walk that allows to stay in the same node
+    A population random walk that allows to stay in the same node.
+    The node sizes are taken from an occupancy histogram of the step, updated as the agents move, instead of counting
+    the population for every candidate node.
+    In "batched" mode all the agents that do not obey move first with a single draw and only then the obeying agents
+    move one after the other - a deterministic approximation of the sequential order that is much faster when most
+    agents do not obey.
+    The sequential part is a compiled loop if numba is installed (see "JitKernels").
     """
 
     def __init__(self,
-                 obey_rate: float):
+                 obey_rate: float,
+                 batched: bool = False):
         Walk.__init__(self)
         self.obey_rate = obey_rate
+        self.batched = batched
 
     def run(self,
             population: Population,
@@ -24,28 +35,99 @@ class WalkSocialDistance(Walk):
         """
         Changes the locations of the individuals according to some logic
         """
-        for agent in population.agents:
-            if agent.e_state != EpidemiologicalState.D:
-                if random.random() < self.obey_rate:
-                    possible_locations = graph.next_nodes(id=agent.location)
-                    possible_locations.append(agent.location)
-                    best_node = 0
-                    best_node_size = 0
-                    for node_id in possible_locations:
-                        size = population.count_node(node_id=node_id)
-                        if best_node_size < size:
-                            best_node = node_id
-                            best_node_size = size
-                    agent.location = best_node
-                else:
-                    possible_locations, weights = graph.next_nodes_with_weight(id=agent.location)
-                    if len(possible_locations) > 0:
-                        possible_locations.append(agent.location)
-                        weights.append(1/len(weights))
-                        picked_location = random.choice(possible_locations)
-                        agent.location = picked_location
+        if isinstance(population, ColumnarPopulation):
+            live_indices = population.live_indices()
+            locations = population.locations[live_indices].astype(np.int64)
+        else:
+            agents = population.agents
+            live_indices = [index for index, agent in enumerate(agents) if agent.e_state != EpidemiologicalState.D]
+            locations = np.array([agents[index].location for index in live_indices], dtype=np.int64)
+        # the histogram counts all the agents, the dead ones included
+        loc_counters = np.asarray(population.count_locations(node_count=graph.get_size() + 1), dtype=np.int64)
+        # one number of each kind per agent (by its index), so the same random stream gives each agent the same draws
+        obeys = (np.random.random(population.get_size()) < self.obey_rate)[live_indices]
+        uniforms = np.random.random(population.get_size())[live_indices]
+        if self.batched:
+            not_obeying = np.flatnonzero(~obeys)
+            new_locations = self.get_transition_table(graph=graph).draw(locations=locations[not_obeying],
+                                                                        uniforms=uniforms[not_obeying])
+            loc_counters -= np.bincount(locations[not_obeying], minlength=len(loc_counters))
+            loc_counters += np.bincount(new_locations, minlength=len(loc_counters))
+            locations[not_obeying] = new_locations
+        if JitKernels.ENABLED:
+            offsets, targets, _ = graph.get_csr()
+            locations = JitKernels.social_distance_walk(locations=locations,
+                                                        obeys=obeys,
+                                                        uniforms=uniforms,
+                                                        loc_counters=loc_counters,
+                                                        offsets=offsets,
+                                                        targets=targets,
+                                                        batched=self.batched).tolist()
+        else:
+            locations = self.sequential_walk(locations=locations.tolist(),
+                                             obeys=obeys.tolist(),
+                                             loc_counters=loc_counters.tolist(),
+                                             graph=graph,
+                                             uniforms=uniforms.tolist())
+        if isinstance(population, ColumnarPopulation):
+            population.set_location(indices=live_indices,
+                                    new_locations=locations)
+        else:
+            for index, new_location in zip(live_indices, locations):
+                agents[index].location = new_location
         return population
 
+    def sequential_walk(self,
+                        locations: list,
+                        obeys: list,
+                        loc_counters: list,
+                        graph: Graph,
+                        uniforms: list = None) -> list:
+        """
+        Move the agents one after the other - an obeying agent goes to the most crowded node among the next nodes and
+        its own, any other agent (unless already moved in batched mode) picks one of them at random
+        """
+        offsets, targets, _ = graph.get_csr()
+        offsets = offsets.tolist()
+        targets = targets.tolist()
+        row_count = len(offsets) - 1
+        if uniforms is None:
+            uniforms = np.random.random(len(locations)).tolist()
+        for position, location in enumerate(locations):
+            obey = obeys[position]
+            if not obey and self.batched:
+                continue
+            possible_locations = targets[offsets[location]:offsets[location + 1]] if location < row_count else []
+            if obey:
+                possible_locations.append(location)
+                best_node = 0
+                best_node_size = 0
+                for node_id in possible_locations:
+                    size = loc_counters[node_id]
+                    if best_node_size < size:
+                        best_node = node_id
+                        best_node_size = size
+            elif len(possible_locations) > 0:
+                possible_locations.append(location)
+                best_node = possible_locations[int(uniforms[position] * len(possible_locations))]
+            else:
+                continue
+            loc_counters[location] -= 1
+            loc_counters[best_node] += 1
+            locations[position] = best_node
+        return locations
+
+    def transition_weights(self,
+                           graph: Graph):
+        """
+        The agents that do not obey pick one of the next nodes or their own node, all with the same probability
+        """
+        offsets, targets, weights = graph.get_csr()
+        return TransitionTable.add_stay(offsets=offsets,
+                                        targets=targets,
+                                        weights=np.ones(len(targets)),
+                                        stay_weights=1)
+
     def __repr__(self):
         return self.__str__()
 